@@ -0,0 +1,45 @@
+import os
+import numpy as np
+
+
+class DocumentTable:
+    def __init__(self):
+        self.doc_ids = np.empty(0, dtype=np.uint64)  # SHA docID indexed by document ordinal
+        self.sorted_doc_ids = np.empty(0, dtype=np.uint64)  # SHA docIDs in ascending order
+        self.sorted_ordinals = np.empty(0, dtype=np.uint32)  # Ordinal of each entry in sorted_doc_ids
+        self.file_path = None
+
+    def read_from_file(self, file_path):
+        """Load the SHA docID of every document ordinal (8 bytes each)."""
+        self.file_path = file_path
+        if os.path.exists(file_path):
+            self.doc_ids = np.fromfile(file_path, dtype='<u8').astype(np.uint64)
+        self.sorted_ordinals = np.argsort(self.doc_ids, kind='stable').astype(np.uint32)
+        self.sorted_doc_ids = self.doc_ids[self.sorted_ordinals]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def get_ordinal(self, docID):
+        """Return the ordinal of a SHA docID, or None if the document is not indexed."""
+        position = np.searchsorted(self.sorted_doc_ids, np.uint64(docID))
+        if position < len(self.sorted_doc_ids) and self.sorted_doc_ids[position] == docID:
+            return int(self.sorted_ordinals[position])
+        return None
+
+    def get_docID(self, ordinal):
+        return int(self.doc_ids[ordinal])
+
+    def add_document(self, docID):
+        """Assign the next ordinal to a new SHA docID and append it to the table file."""
+        ordinal = len(self.doc_ids)
+        self.doc_ids = np.append(self.doc_ids, np.uint64(docID))
+
+        position = np.searchsorted(self.sorted_doc_ids, np.uint64(docID))
+        self.sorted_doc_ids = np.insert(self.sorted_doc_ids, position, np.uint64(docID))
+        self.sorted_ordinals = np.insert(self.sorted_ordinals, position, ordinal)
+
+        with open(self.file_path, 'ab') as file:
+            file.write(np.uint64(docID).astype('<u8').tobytes())
+
+        return ordinal
@@ -1,64 +1,188 @@
+import os
+import mmap
+import bisect
 import struct
+import numpy as np
+
+
+def pack_entry(word, word_id):
+    """Serialize a lexicon log entry: 1 byte word length, the word and 4 bytes word ID."""
+    encoded = word.encode('utf-8')
+    return struct.pack(f"<B{len(encoded)}sI", len(encoded), encoded, word_id)
+
+
+# Header of the lexicon file: magic, number of words, number of wordID slots, length of the word blob
+LEXICON_HEADER = struct.Struct("<4sIII")
+LEXICON_MAGIC = b'GLEX'
+
+# Position of a wordID that is not assigned to any word
+NO_POSITION = 0xFFFFFFFF
+
+
+class SortedWords:
+    """
+    Read-only view of a lexicon file: the words sorted bytewise in one blob with an array of their
+    offsets, the wordID of every word and the sorted position of every wordID. Lookups are binary
+    searches and array reads on the (memory-mapped) buffer, so no Python object is kept per word.
+    """
+
+    def __init__(self, buffer):
+        magic, count, id_count, blob_length = LEXICON_HEADER.unpack_from(buffer, 0)
+        if magic != LEXICON_MAGIC:
+            raise ValueError("Not a lexicon file")
+
+        offset = LEXICON_HEADER.size
+        self.offsets = np.frombuffer(buffer, dtype='<u4', count=count + 1, offset=offset)  # Word offsets in the blob
+        offset += (count + 1) * 4
+        self.ids = np.frombuffer(buffer, dtype='<u4', count=count, offset=offset)  # WordID of every sorted word
+        offset += count * 4
+        self.positions = np.frombuffer(buffer, dtype='<u4', count=id_count, offset=offset)  # Sorted position by wordID
+        offset += id_count * 4
+        self.blob_start = offset
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, position):
+        """Encoded word at a sorted position, which lets bisect search the words."""
+        start = self.blob_start + int(self.offsets[position])
+        return self.buffer[start:self.blob_start + int(self.offsets[position + 1])]
+
+    def get_word_id(self, word):
+        encoded = word.encode('utf-8')
+        position = bisect.bisect_left(self, encoded)
+        if position < len(self) and self[position] == encoded:
+            return int(self.ids[position])
+        return None
+
+    def get_word(self, wordID):
+        if not 0 <= wordID < len(self.positions) or self.positions[wordID] == NO_POSITION:
+            return None
+        return self[int(self.positions[wordID])].decode('utf-8')
+
+    def items(self):
+        """Iterate over all (word, wordID) pairs in sorted order."""
+        for position in range(len(self)):
+            yield self[position].decode('utf-8'), int(self.ids[position])
+
+    @staticmethod
+    def write(file, entries):
+        """Write (word, wordID) pairs to a file in the lexicon file format."""
+        encoded = sorted((word.encode('utf-8'), word_id) for word, word_id in entries)
+        offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        offsets[1:] = np.cumsum([len(word) for word, _ in encoded])
+        ids = np.array([word_id for _, word_id in encoded], dtype='<u4')
+        positions = np.full(int(ids.max()) + 1 if len(ids) else 0, NO_POSITION, dtype='<u4')
+        positions[ids] = np.arange(len(ids))
+        blob = b''.join(word for word, _ in encoded)
+
+        file.write(LEXICON_HEADER.pack(LEXICON_MAGIC, len(encoded), len(positions), len(blob)))
+        file.write(offsets.tobytes())
+        file.write(ids.tobytes())
+        file.write(positions.tobytes())
+        file.write(blob)
 
 
 class Lexicon:
     def __init__(self):
-        self.word_to_id = {}  # Dictionary to store word -> unique ID mapping
-        self.id_to_word = {}  # Dictionary for reverse lookup
+        self.words = None  # Words of the lexicon file (see SortedWords)
+        self.word_to_id = {}  # Words added since the lexicon file was read: word -> unique ID
+        self.id_to_word = {}  # Dictionary for reverse lookup of the added words
         self.current_id = 0    # Starting ID for words
+        self.log_file = None  # Append-only log of the words added since the lexicon file was written
+        self.log_entries = 0  # Number of words in the log
 
     def add_word(self, word):
-        if word not in self.word_to_id:
+        if self.get_word_id(word) is None:
             self.word_to_id[word] = self.current_id
             self.id_to_word[self.current_id] = word
+            if self.log_file is not None:
+                self.log_file.write(pack_entry(word, self.current_id))
+                self.log_entries += 1
             self.current_id += 1  # Increment ID for the next word
 
     def get_word_id(self, word):
-        return self.word_to_id.get(word, None)
+        wordID = self.word_to_id.get(word, None)
+        if wordID is None and self.words is not None:
+            wordID = self.words.get_word_id(word)
+        return wordID
 
     def get_word(self, wordID):
-        return self.id_to_word.get(wordID, None)
+        word = self.id_to_word.get(wordID, None)
+        if word is None and self.words is not None:
+            word = self.words.get_word(wordID)
+        return word
 
     def get_lexicon(self):
-        return self.word_to_id
+        """Return the whole lexicon as a dictionary of word -> wordID (creates an object per word)."""
+        lexicon = dict(self.words.items()) if self.words is not None else {}
+        lexicon.update(self.word_to_id)
+        return lexicon
 
     def write_to_file(self, filename):
-        with open(filename, 'wb') as file:
-            for word, word_id in self.word_to_id.items():
-                word_length = len(word)
+        # Written to a temporary file first so a crash never leaves a partial lexicon
+        with open(filename + '.tmp', 'wb') as file:
+            SortedWords.write(file, self.get_lexicon().items())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(filename + '.tmp', filename)
 
-                data = struct.pack(f"<B{word_length}sI", word_length, word.encode('utf-8', errors='remove'), word_id)
-                file.write(data)
+    def open_log(self, log_filename):
+        """
+        Add the words logged since the lexicon file was last written, then log every new word
+        at the end of log_filename (1 byte word length, the word and 4 bytes wordID per entry).
+        """
+        length = self.read_log(log_filename)
+        self.log_file = open(log_filename, 'ab')
+        self.log_file.truncate(length)  # Drop a partial entry so new entries line up
+
+    def read_log(self, log_filename):
+        """Add the words logged in log_filename without opening it for writing. Returns the length read."""
+        data = b''
+        if os.path.exists(log_filename):
+            with open(log_filename, 'rb') as file:
+                data = file.read()
+
+        offset = 0
+        self.log_entries = 0
+        while offset < len(data):
+            word_length = data[offset]
+            end = offset + 1 + word_length + 4
+            if end > len(data):
+                break  # Entry cut short by a crash
+            word = data[offset + 1:end - 4].decode('utf-8')
+            word_id = struct.unpack_from("<I", data, end - 4)[0]
+            self.word_to_id[word] = word_id
+            self.id_to_word[word_id] = word
+            self.current_id = max(self.current_id, word_id + 1)
+            self.log_entries += 1
+            offset = end
+        return offset
+
+    def sync_log(self):
+        """Force the logged words to disk."""
+        if self.log_file is not None:
+            self.log_file.flush()
+            os.fsync(self.log_file.fileno())
+
+    def compact_log(self, filename):
+        """Write the whole lexicon to filename and empty the log."""
+        self.write_to_file(filename)
+        self.log_file.flush()
+        self.log_file.truncate(0)
+        self.log_entries = 0
+        self.read_from_file(filename)  # Serve the new file instead of the added words
 
     def read_from_file(self, filename):
-        with open(filename, 'rb') as file:
-            while True:
-                # Read 1 byte for the word length
-                length_data = file.read(1)
-                if not length_data:
-                    break  # End of file
-
-                # Unpack the word length
-                word_length = struct.unpack("<B", length_data)[0]
-
-                # Read the word and 4 bytes for the ID
-                word_data = file.read(word_length)
-                id_data = file.read(4)
-
-                # Unpack the word and ID
-                try:
-                    word = word_data.decode('utf-8')
-                    prev_word = word
-                except UnicodeDecodeError as e:
-                    # Print the byte sequence that caused the error
-                    print(f"Error at byte position {e.start}-{e.end}: {word[e.start:e.end]}")
-                    print(prev_word)
-
-                word_id = struct.unpack("<I", id_data)[0]
-
-                # Reconstruct the dictionaries
-                self.word_to_id[word] = word_id
-                self.id_to_word[word_id] = word
-
-                # Update the current ID (optional, useful for adding new words after reading)
-                self.current_id = max(self.current_id, word_id + 1)
\ No newline at end of file
+        """Memory-map a lexicon file. Words added before are dropped, they must be in the file."""
+        words = None
+        if os.path.getsize(filename) > 0:
+            with open(filename, 'rb') as file:
+                words = SortedWords(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+        # The file is swapped in before the added words are dropped, so concurrent lookups keep finding them
+        self.words = words
+        self.word_to_id = {}
+        self.id_to_word = {}
+        self.current_id = len(words.positions) if words is not None else 0
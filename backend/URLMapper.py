@@ -1,36 +1,24 @@
 import os
+import numpy as np
 
 
 class URLMapper:
     def __init__(self):
-        self.id_to_offset = {}  # Maps docID to offset
+        self.offsets = np.empty(0, dtype=np.uint64)  # Offset of each document, indexed by document ordinal
 
     def read_offsets_from_file(self, offset_file_path):
-        """Reads the offset file and populates the id_to_offset hash table."""
+        """Reads the offset file (8 bytes per document ordinal) into the offsets array."""
         try:
-            with open(offset_file_path, 'rb') as file:
-                while True:
-                    # Read 8 bytes for the docID
-                    docID_bytes = file.read(8)
-                    if not docID_bytes:  # End of file
-                        break
-
-                    docID = int.from_bytes(docID_bytes, byteorder='big')
-
-                    # Read 8 bytes for the offset
-                    offset = int.from_bytes(file.read(8), byteorder='big')
-
-                    # Store in the hash table
-                    self.id_to_offset[docID] = offset
+            self.offsets = np.fromfile(offset_file_path, dtype='<u8').astype(np.uint64)
         except Exception as e:
             print(f"Error reading offset file: {e}")
 
     def get_details_by_docID(self, docID, file_path):
-        """Fetches details (URL, title, tags, authors) by docID using the offset."""
+        """Fetches details (URL, title, tags, authors) by document ordinal using the offset."""
         try:
-            offset = self.id_to_offset.get(docID)
-            if offset is None:
+            if docID >= len(self.offsets):
                 return None  # docID not found
+            offset = int(self.offsets[docID])
 
             with open(file_path, 'rb') as file:
                 # Seek to the offset
@@ -81,7 +69,7 @@ class URLMapper:
             return None
 
     def add_entry(self, docID, url, title, tags, authors, text):
-        """Adds a new entry to the URL mapper file and stores its offset."""
+        """Adds a new entry for a document ordinal to the URL mapper file and stores its offset."""
         try:
             with open('files/url_mapper.bin', 'ab+') as file:
                 # Determine the current offset (end of the file)
@@ -120,12 +108,14 @@ class URLMapper:
                 file.write(text_encoded)
 
                 # Update the offset mapping
-                self.id_to_offset[docID] = offset
-
-            # Update the offset file
-            with open('files/offsets.bin', 'ab') as offset_file:
-                offset_file.write(docID.to_bytes(8, byteorder='big'))
-                offset_file.write(offset.to_bytes(8, byteorder='big'))
+                if docID >= len(self.offsets):
+                    self.offsets = np.resize(self.offsets, docID + 1)
+                self.offsets[docID] = offset
+
+            # Update the offset file at the position of the document ordinal
+            with open('files/offsets.bin', 'r+b' if os.path.exists('files/offsets.bin') else 'wb') as offset_file:
+                offset_file.seek(docID * 8)
+                offset_file.write(offset.to_bytes(8, byteorder='little'))
 
         except Exception as e:
             print(f"Error adding entry for docID {docID}: {e}")
@@ -1,130 +1,229 @@
+import os
 import time
+import json
+import queue
+import atexit
 import threading
+from concurrent.futures import ThreadPoolExecutor
+import base64
 import preprocessing
 import struct
+import numpy as np
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 from Lexicon import Lexicon
 from inverted_index import BarrelReader
+from segmented_index import SegmentedIndex
 from URLMapper import URLMapper
+from DocumentTable import DocumentTable
+from scoring import TermScorer
+from query_planner import CandidateSet, LazyRanking
+from result_cache import ResultCache
+from write_ahead_log import WriteAheadLog, fsync_paths
+from upload_tracker import UploadTracker, QUEUED, INDEXED, FAILED
 from hashlib import sha256
 from max_frequencies_reader import max_frequency_reader, add_max_frequency_entry
-from correction import correct_query
+from correction import SpellCorrector
+from snapshot import load_snapshot, restore
 
 # Initialize Flask app
 app = Flask(__name__)
 CORS(app)
 
+# A read-only server answers queries from the index as it is on disk at startup, without the write-ahead log.
+# serve.py runs its worker processes this way, uploads go to a single server started with app.py.
+READ_ONLY = os.environ.get('GLOOBLE_READ_ONLY') == '1'
+
 # Initialize global variables
 lexicon = Lexicon()
-barrel_reader = BarrelReader()
+barrel_reader = BarrelReader(use_mmap=True)
 url_mapper = URLMapper()
+documents = DocumentTable()
 num_barrels = barrel_reader.num_barrels
 
-# Initialize data
-lexicon.read_from_file('files/lexicon.bin')
-barrel_reader.load_offsets('barrels/inverted_index/offsets.bin')
-url_mapper.read_offsets_from_file('files/offsets.bin')
-num_documents, max_frequencies = max_frequency_reader('files/max_frequencies.bin')
+# Initialize data. The lookup tables come from the startup snapshot when it matches the files (see snapshot.py),
+# otherwise they are read from the files; the files are loaded in parallel either way
+load_start = time.time()
+snapshot = load_snapshot()
+with ThreadPoolExecutor() as loader:
+    loads = [loader.submit(lexicon.read_from_file, 'files/lexicon.bin'),
+             loader.submit(preprocessing.load_lemma_dictionary, 'files/lemmas.bin'),
+             loader.submit(barrel_reader.open_barrels)]
+    if snapshot is None:
+        loads += [loader.submit(barrel_reader.load_offsets),
+                  loader.submit(url_mapper.read_offsets_from_file, 'files/offsets.bin'),
+                  loader.submit(documents.read_from_file, 'files/documents.bin')]
+        max_frequencies = loader.submit(max_frequency_reader, 'files/max_frequencies.bin')
+        loads.append(max_frequencies)
+    for load in loads:
+        load.result()  # Raise the error of a failed load
+if READ_ONLY:
+    lexicon.read_log('files/lexicon.log')
+else:
+    lexicon.open_log('files/lexicon.log')
+index = SegmentedIndex(barrel_reader)
+if not READ_ONLY:
+    atexit.register(index.flush)  # Keep the buffered postings of uploaded documents
+
+# Spelling corrections come from the words of the lexicon. Without a snapshot its deletes index is built in the
+# background, or before serving by a read-only server so that forked workers share it instead of building their own.
+corrector = SpellCorrector(lexicon, index)
+if snapshot is not None:
+    num_documents = restore(snapshot, barrel_reader, documents, url_mapper, corrector)
+else:
+    num_documents, _ = max_frequencies.result()
+    if READ_ONLY:
+        corrector.build()
+    else:
+        threading.Thread(target=corrector.build, daemon=True).start()
+scorer = TermScorer(num_documents)
+print(f"Index loaded in {time.time() - load_start:.3f}s" + (" from the snapshot" if snapshot is not None else ""))
 
-# Global variable to store sorted_docIDs for the latest query
-global_sorted_docIDs = []
-previous_query = ""
+# spaCy is only needed for words missing from the lemma dictionary and for uploads, it loads in the background
+threading.Thread(target=preprocessing.get_nlp, daemon=True).start()
 
+# Number of results shown on a page
+RESULTS_PER_PAGE = 14
 
-def sha_256(data):
-    # Compute SHA-256 hash
-    hash_value = sha256(data.encode('utf-8')).digest()
+# Ranking states of recent queries, keyed by query words and the use_original flag.
+# GLOOBLE_QUERY_CACHE sets the number of entries, 0 disables it (benchmark.py measures queries without it).
+result_cache = ResultCache(max_entries=int(os.environ.get('GLOOBLE_QUERY_CACHE', 256)))
 
-    # Extract the first 8 bytes and convert to an integer
-    checksum = int.from_bytes(hash_value[:8], byteorder='big')  # Use 'little' if needed
+# Files written when uploads are applied, forced to disk before the log records are released
+STATE_FILES = ['files/documents.bin', 'files/url_mapper.bin', 'files/offsets.bin', 'files/max_frequencies.bin']
 
-    return checksum
+# Number of words in the lexicon log after which a checkpoint rewrites the lexicon file
+LEXICON_LOG_ENTRIES = 100000
 
+# Number of uploads that may wait to be indexed before /upload pushes back
+MAX_PENDING_UPLOADS = 1000
 
-def process_word(word, result):
-    """Retrieve docIDs for a single word and append as a set of docIDs with their scores."""
-    wordID = lexicon.get_word_id(word)
-    docIDs_and_scores = barrel_reader.read_docIDs_and_scores(wordID, num_documents, max_frequencies)
+# Seconds an upload waits for room in the indexing queue before it is refused
+UPLOAD_WAIT = 5
 
-    docID_scores = {}  # Dictionary to store cumulative scores for each docID
+# Number of threads tokenizing uploaded articles (indexing itself happens in log order on one thread)
+INDEXER_WORKERS = 4
 
-    for docID, score in docIDs_and_scores:
-        if docID is not None:
-            if docID not in docID_scores:
-                docID_scores[docID] = score
-            else:
-                docID_scores[docID] += score  # Add the score if docID is repeated
+# Number of articles of a bulk upload that are logged, tokenized and indexed together
+BULK_BATCH_SIZE = 500
 
-    result.append(docID_scores)  # Append the dictionary of docID => total_score
+# Fields of an article kept in the write-ahead log, and the ones that are tokenized
+ARTICLE_FIELDS = ('url', 'title', 'text', 'authors', 'tags')
+TEXT_FIELDS = ('text', 'title', 'authors', 'tags')
 
+upload_slots = threading.BoundedSemaphore(MAX_PENDING_UPLOADS)
+analyzers = ThreadPoolExecutor(max_workers=INDEXER_WORKERS)
+upload_tracker = UploadTracker()
 
-# Fetch details of each unique docID
-def handle_query(query, use_original=False):
-    """Handles the incoming query and retrieves common docIDs and their details."""
-    global global_sorted_docIDs  # Access global variable
-    word_corrections = []
+# Uploads committed to the write-ahead log with their pending analysis, waiting to be indexed in log order.
+# A record is either one article or {"articles": [...]} for a batch of a bulk upload.
+apply_queue = queue.Queue()
+wal = None if READ_ONLY else WriteAheadLog('files/wal', on_commit=lambda lsn, record: apply_queue.put(
+    (lsn, record, analyzers.submit(analyze_record, record))))
 
-    # Correct query
-    if not use_original:
-        query, word_corrections = correct_query(query)
 
-    words = preprocessing.tokenize_text(query)
-    threads = []
-    result = []
+def public_doc_id(url):
+    """ID of a document in the API: its SHA docID as 16 hex digits, which JSON numbers cannot hold exactly."""
+    return f"{sha_256(url):016x}"
 
-    for word in words:
-        thread = threading.Thread(target=process_word, args=(word, result))
-        threads.append(thread)
-        thread.start()
 
-    for thread in threads:
-        thread.join()
+def sha_256(data):
+    # Compute SHA-256 hash
+    hash_value = sha256(data.encode('utf-8')).digest()
 
-    # If we have common docIDs, retrieve their details
-    if result:
-        # Find common docIDs across all sets
-        common_doc_ids = set.intersection(*[set(docID_scores.keys()) for docID_scores in result])
+    # Extract the first 8 bytes and convert to an integer
+    checksum = int.from_bytes(hash_value[:8], byteorder='big')  # Use 'little' if needed
 
-        # Accumulate scores for common docIDs
-        docID_final_scores = {}
+    return checksum
 
-        for docID_scores in result:
-            for docID, score in docID_scores.items():
-                if docID in common_doc_ids:
-                    if docID not in docID_final_scores:
-                        docID_final_scores[docID] = score
-                    else:
-                        docID_final_scores[docID] += score
 
-        # Sort docIDs by their final accumulated scores
-        global_sorted_docIDs = sorted(docID_final_scores.items(), key=lambda x: x[1], reverse=True)
+def encode_cursor(words, use_original, word_corrections):
+    """
+    Cursor of a ranking: the query words after correction and tokenization, the use_original flag and the
+    corrections, so that any server process can resume or rebuild the ranking from it.
+    """
+    state = json.dumps([words, use_original, word_corrections], separators=(',', ':'))
+    return base64.urlsafe_b64encode(state.encode('utf-8')).rstrip(b'=').decode('ascii')
 
-        return global_sorted_docIDs, word_corrections  # Return the sorted docIDs for pagination
 
-    return [], []  # Return an empty list if no common docIDs are found
+def decode_cursor(cursor):
+    """Return the (words, use_original, word_corrections) of a cursor, or None if it is not a valid cursor."""
+    try:
+        state = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        words, use_original, word_corrections = state
+    except (TypeError, ValueError):
+        return None
+    if (not isinstance(words, list) or not words or not all(isinstance(word, str) for word in words) or
+            not isinstance(use_original, bool) or not isinstance(word_corrections, list)):
+        return None
+    return words, use_original, [tuple(correction) for correction in word_corrections]
 
 
-def add_article(data):
-    # Extract data
-    text = data.get('text', '')
-    title = data.get('title', '')
-    authors = data.get('authors', '')
-    tags = data.get('tags', '')
-    url = data.get('url', '')
-
+# Fetch details of each unique docID
+def handle_query(query, use_original=False, k=RESULTS_PER_PAGE, exact_total=True, cursor=None):
+    """
+    Handles the incoming query and retrieves the k best common docIDs ranked by their scores,
+    along with the total number of common docIDs (estimated if exact_total is False).
+    A cursor returned by an earlier call skips correction and tokenization, and resumes the ranking
+    when this process still caches it. Returns the docIDs, the total, the word corrections and the cursor.
+    """
+    state = decode_cursor(cursor) if cursor else None
+    if state is None:
+        word_corrections = []
+
+        # Correct query
+        if not use_original:
+            query, word_corrections = corrector.correct_query(query)
+
+        words = preprocessing.tokenize_query(query)
+        if not words:
+            return np.empty(0, dtype=np.uint32), 0, [], None  # Return an empty array if there is nothing to search
+        cursor = encode_cursor(words, use_original, word_corrections)
+    else:
+        words, use_original, word_corrections = state
+
+    # Reuse the ranking of the same query words, or start a new one that is computed lazily
+    cache_key = (tuple(words), use_original)
+    ranking = result_cache.get(cache_key)
+    if ranking is None:
+        generation = result_cache.generation
+        wordIDs = [lexicon.get_word_id(word) for word in words]
+        ranking = LazyRanking(CandidateSet.from_query(index, scorer, wordIDs))
+        result_cache.put(cache_key, ranking, generation)
+
+    # Only the results up to the requested page are ranked
+    top_doc_ids, _ = ranking.top(k)
+    return top_doc_ids, ranking.total(exact_total), word_corrections, cursor
+
+
+def analyze_article(data):
+    """
+    Tokenize an article and count its term frequencies and context flags. Does not touch the index,
+    so articles can be analyzed in parallel. Returns the article, term frequencies and context flags.
+    """
     # Preprocess data
-    tokens = preprocessing.tokenize_text(text)
-    title_tokens = preprocessing.tokenize_text(title)
-    authors_tokens = preprocessing.tokenize_text(authors)
-    tags_tokens = preprocessing.tokenize_text(tags)
+    return (data, *count_terms(*(preprocessing.tokenize_text(data.get(field, '')) for field in TEXT_FIELDS)))
+
+
+def analyze_articles(articles):
+    """Analyze many articles like analyze_article, lemmatizing all their fields in batched spaCy passes."""
+    tokens = preprocessing.tokenize_texts(article.get(field, '') for article in articles for field in TEXT_FIELDS)
+    fields = len(TEXT_FIELDS)
+    return [(article, *count_terms(*tokens[i * fields:(i + 1) * fields])) for i, article in enumerate(articles)]
+
 
+def analyze_record(record):
+    """Analyze the articles of a write-ahead log record."""
+    if 'articles' in record:
+        return analyze_articles(record['articles'])
+    return [analyze_article(record)]
+
+
+def count_terms(tokens, title_tokens, authors_tokens, tags_tokens):
+    """Count the term frequencies and context flags of the tokens of an article's fields."""
     # Combine tokens for frequency calculation
     all_tokens = tokens + title_tokens + authors_tokens + tags_tokens
 
-    # Get docID
-    docID = sha_256(url)
-
     # Calculate term frequencies and context flags
     term_frequency = {}
     context_flags = {}
@@ -144,18 +243,46 @@ def add_article(data):
         if token in authors_tokens:
             context_flags[token] |= 1 << 3  # Bit 4: authors
 
+    return term_frequency, context_flags
+
+
+def index_article(data, term_frequency, context_flags):
+    """Add an analyzed article (see analyze_article) to the index. Articles must be indexed in log order."""
+    text = data.get('text', '')
+    title = data.get('title', '')
+    authors = data.get('authors', '')
+    tags = data.get('tags', '')
+    url = data.get('url', '')
+
+    if not term_frequency:
+        raise ValueError("Article has no words to index")
+
+    # Get the document ordinal, reusing it if the URL was uploaded before
+    sha_docID = sha_256(url)
+    docID = documents.get_ordinal(sha_docID)
+    is_new_document = docID is None
+    if is_new_document:
+        docID = documents.add_document(sha_docID)
+
     # Get the maximum frequency
     max_frequency = max(term_frequency.values())
 
-    # Add tokens to lexicon and inverted index
+    # Add tokens to lexicon and collect the postings of the document
+    word_data = []
     for word, frequency in term_frequency.items():
-        lexicon.add_word(word)
         wordID = lexicon.get_word_id(word)
+        if wordID is None:
+            lexicon.add_word(word)
+            wordID = lexicon.get_word_id(word)
+            corrector.add_word(word, wordID)
 
         # Retrieve the context flag for the current word
         context_flag = context_flags[word]
 
-        barrel_reader.update_barrel_entry(wordID, docID, (docID, context_flag, frequency))
+        word_data.append((wordID, context_flag, frequency))
+
+    # Buffer the postings in the inverted index, they reach the barrels through compaction
+    index.add_document(docID, word_data, max_frequency)
 
     # Make entry in URL mapper
     url_mapper.add_entry(docID, url, title, tags, authors, text)
@@ -163,72 +290,253 @@ def add_article(data):
     # Add entry in max frequency file
     add_max_frequency_entry(docID, max_frequency)
 
-    # Update lexicon
-    lexicon.write_to_file('files/lexicon.bin')
-
     # Update global variables
     global num_documents
-    global max_frequencies
-    num_documents += 1
-    max_frequencies[docID] = max_frequency
-
-
-# Return query response with pagination
-@app.route('/query', methods=['POST'])
-def query():
-    """Endpoint to handle search queries."""
-    start = time.time()
-    data = request.get_json()
+    if is_new_document:
+        num_documents += 1
+    scorer.total_docs = num_documents
+
+
+def checkpoint(applied_lsn):
+    """
+    Write the state built by the uploads applied up to applied_lsn to disk,
+    then drop the write-ahead log segments that only hold these uploads.
+    """
+    index.flush()
+    lexicon.sync_log()
+    if lexicon.log_entries >= LEXICON_LOG_ENTRIES:
+        lexicon.compact_log('files/lexicon.bin')
+    fsync_paths(STATE_FILES)
+    wal.release(applied_lsn)
+
+
+def apply_record(lsn, record, analyze):
+    """
+    Index the articles of a write-ahead log record, given a function returning their analyses,
+    and track the state of every article.
+    """
+    articles = record['articles'] if 'articles' in record else [record]
+    try:
+        analyses = analyze()
+    except Exception as e:
+        print(f"Error analyzing upload {lsn}: {e}")
+        analyses = [None] * len(articles)
+
+    for article, analysis in zip(articles, analyses):
+        doc_id = public_doc_id(article.get('url', ''))
+        try:
+            if analysis is None:
+                raise ValueError("Article could not be tokenized")
+            index_article(*analysis)
+            upload_tracker.update(doc_id, lsn, INDEXED)
+        except Exception as e:
+            print(f"Error applying upload {lsn}: {e}")
+            upload_tracker.update(doc_id, lsn, FAILED, str(e))
+
+    # The postings of a bulk batch go into a delta segment of their own
+    if 'articles' in record:
+        index.flush()
+
+    # Cached results no longer reflect the index, invalidated once for all the articles of the record
+    result_cache.invalidate()
+
+
+def apply_uploads():
+    """Index the committed uploads in log order, checkpointing whenever a log segment is full."""
+    while True:
+        lsn, record, analysis = apply_queue.get()
+        try:
+            apply_record(lsn, record, analysis.result)
+        finally:
+            upload_slots.release()
+
+        if wal.releasable(lsn):
+            checkpoint(lsn)
+
+
+# Replay the uploads that were logged but maybe not written to disk before the last shutdown.
+# Uploads are applied in the same order as before, so words get the same IDs again.
+if not READ_ONLY:
+    for lsn, record in wal.recovered:
+        apply_record(lsn, record, lambda: analyze_record(record))
+    if wal.releasable(wal.durable_lsn):
+        checkpoint(wal.durable_lsn)
+    threading.Thread(target=apply_uploads, daemon=True).start()
+
+
+# Read-only servers refuse uploads, which only the server that owns the write-ahead log can index
+@app.before_request
+def refuse_uploads():
+    if READ_ONLY and request.endpoint in ('upload', 'upload_bulk'):
+        return jsonify({"error": "This server is read-only, send uploads to the indexing server"}), 503
+
+
+def search(data):
+    """
+    Answer a query request: query, page_number, use_original, exact_total and cursor fields.
+    Returns the response and its HTTP status, shared by /query and the socket server of backend.py.
+    """
     query_text = data.get('query', '')
     page_number = data.get('page_number', 1)
     use_original = data.get('use_original', False)
-    word_corrections = []
+    exact_total = data.get('exact_total', True)
+    cursor = data.get('cursor')
 
     if not query_text:
-        return jsonify({"error": "Query cannot be empty"}), 400
+        return {"error": "Query cannot be empty"}, 400
+
+    # Calculate the range of docIDs to return for the requested page
+    start_index = (page_number - 1) * RESULTS_PER_PAGE
+    end_index = start_index + RESULTS_PER_PAGE
 
     # Process the query and get results
-    global global_sorted_docIDs
-    global previous_query
-    if not global_sorted_docIDs or query_text != previous_query or use_original:
-        # New query or if the query is different from the last one
-        global_sorted_docIDs, word_corrections = handle_query(query_text, use_original)
-        previous_query = query_text
-
-    if global_sorted_docIDs:
-        # Calculate the range of docIDs to return for the requested page
-        start_index = (page_number - 1) * 14
-        end_index = start_index + 14
+    sorted_docIDs, total_results, word_corrections, cursor = handle_query(
+        query_text, use_original, end_index, exact_total, cursor)
 
+    if len(sorted_docIDs):
         # Get the details of the documents in the specified range
-        page_docIDs = global_sorted_docIDs[start_index:end_index]
+        page_docIDs = sorted_docIDs[start_index:end_index]
 
         doc_details = []
-        for docID, _ in page_docIDs:
+        for docID in page_docIDs.tolist():
             details = url_mapper.get_details_by_docID(docID, 'files/url_mapper.bin')
             if details:
                 doc_details.append(details)
 
-        print(time.time()-start)
-        return jsonify({"results": doc_details,
-                        "total_results": len(global_sorted_docIDs),
-                        "corrections": word_corrections})
+        return {"results": doc_details,
+                "total_results": total_results,
+                "corrections": word_corrections,
+                "cursor": cursor}, 200
     else:
-        return jsonify({"error": "No results found"}), 404
+        return {"error": "No results found"}, 404
+
+
+# Return query response with pagination
+@app.route('/query', methods=['POST'])
+def query():
+    """Endpoint to handle search queries."""
+    response, status = search(request.get_json())
+    return jsonify(response), status
+
+
+# Expose the query result cache counters
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+
+# Readiness probe: 200 once queries are served at full speed, 503 while the corrector or spaCy is still loading
+@app.route('/ready', methods=['GET'])
+def ready():
+    components = {"index": True, "corrector": corrector.ready, "lemmatizer": preprocessing.nlp is not None,
+                  "snapshot": snapshot is not None}
+    ready = components["corrector"] and components["lemmatizer"]
+    return jsonify({"ready": ready, **components}), 200 if ready else 503
 
 
 # Define an endpoint for uploading articles
 @app.route('/upload', methods=['POST'])
 def upload():
+    # Push back while too many uploads wait to be indexed
+    if not upload_slots.acquire(timeout=UPLOAD_WAIT):
+        return jsonify({"error": "Too many uploads waiting to be indexed, retry later"}), 503, {"Retry-After": str(UPLOAD_WAIT)}
+
     try:
-        # Process the request
+        # Log the article; it is indexed in the background once the log is on disk
         data = request.get_json()
-        add_article(data)  # Call your function
-        return jsonify({"success": True}), 200
+        article = {field: data.get(field, '') for field in ARTICLE_FIELDS}
+        doc_id = public_doc_id(article['url'])
+        lsn = wal.append(article)
+        upload_tracker.update(doc_id, lsn, QUEUED)
+        return jsonify({"success": True, "doc_id": doc_id, "status": QUEUED}), 202
     except Exception as e:
+        upload_slots.release()
         return jsonify({"error": str(e)}), 500
 
 
+# Report whether an uploaded document is visible to queries yet
+@app.route('/upload/status/<doc_id>', methods=['GET'])
+def upload_status(doc_id):
+    entry = upload_tracker.get(doc_id)
+    if entry is not None:
+        _, state, error = entry
+        response = {"doc_id": doc_id, "status": state}
+        if error:
+            response["error"] = error
+        return jsonify(response)
+
+    # Documents indexed before the tracked uploads
+    try:
+        indexed = documents.get_ordinal(int(doc_id, 16)) is not None
+    except (ValueError, OverflowError):
+        indexed = False
+    if indexed:
+        return jsonify({"doc_id": doc_id, "status": INDEXED})
+    return jsonify({"error": "Unknown document"}), 404
+
+
+def read_bulk_articles():
+    """Yield the articles of a bulk upload, sent as a JSON array or as NDJSON (one article per line)."""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        for line in request.stream:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        data = request.get_json()
+        if not isinstance(data, list):
+            raise ValueError("Expected a JSON array of articles")
+        yield from data
+
+
+def log_bulk_batch(articles):
+    """
+    Log a batch of articles as one record, waiting for room in the indexing queue.
+    Returns the document IDs of the articles, or None if the queue stayed full.
+    """
+    if not upload_slots.acquire(timeout=UPLOAD_WAIT):
+        return None
+    try:
+        lsn = wal.append({"articles": articles})
+    except Exception:
+        upload_slots.release()
+        raise
+
+    doc_ids = [public_doc_id(article['url']) for article in articles]
+    for doc_id in doc_ids:
+        upload_tracker.update(doc_id, lsn, QUEUED)
+    return doc_ids
+
+
+def read_bulk_batches():
+    """Yield the articles of a bulk upload in batches of BULK_BATCH_SIZE, keeping only their logged fields."""
+    batch = []
+    for data in read_bulk_articles():
+        batch.append({field: data.get(field, '') for field in ARTICLE_FIELDS})
+        if len(batch) == BULK_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# Define an endpoint for uploading many articles at once
+@app.route('/upload/bulk', methods=['POST'])
+def upload_bulk():
+    doc_ids = []
+    try:
+        # Articles are logged batch by batch while the request is read
+        for batch in read_bulk_batches():
+            batch_doc_ids = log_bulk_batch(batch)
+            if batch_doc_ids is None:
+                return jsonify({"error": "Too many uploads waiting to be indexed, retry the remaining articles later",
+                                "doc_ids": doc_ids}), 503, {"Retry-After": str(UPLOAD_WAIT)}
+            doc_ids += batch_doc_ids
+    except (ValueError, AttributeError) as e:
+        return jsonify({"error": f"Invalid articles: {e}", "doc_ids": doc_ids}), 400
+
+    return jsonify({"success": True, "doc_ids": doc_ids, "status": QUEUED}), 202
+
+
 # Run the Flask app
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5000)
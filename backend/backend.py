@@ -1,69 +1,98 @@
-import threading
-import socket
+import os
 import json
-import preprocessing
-from Lexicon import Lexicon
-from inverted_index import BarrelReader
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
-# Define global variables
-lexicon = Lexicon()
-barrel_reader = BarrelReader()
+# The socket server answers queries with the index of a read-only app, uploads go to the server of app.py
+os.environ['GLOOBLE_READ_ONLY'] = '1'
+import app  # noqa: E402
 
+# Number of threads running queries, shared by all connections
+QUERY_WORKERS = 8
 
-def process_word(word, result):
-    print(word)
-    wordID = lexicon.get_word_id(word)
-    print(wordID)
-    docIDs = barrel_reader.read_docIDs(wordID)
+# Requests of one connection being answered at a time; reading stops while that many are pending
+MAX_PIPELINED = 64
 
-    if docIDs is not None:
-        result.append(set(docIDs))  # Append as a set
+# Longest request line accepted, in bytes
+MAX_LINE = 64 * 1024
 
+executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS)
 
-def handle_query(query):
-    """Handles the incoming query and retrieves common docIDs."""
-    words = preprocessing.tokenize_text(query)
-    threads = []
-    result = []
 
-    for word in words:
-        thread = threading.Thread(target=process_word, args=(word, result))
-        threads.append(thread)
-        thread.start()
+def answer(line):
+    """Answer one request line. Runs in the executor."""
+    try:
+        data = json.loads(line)
+        if not isinstance(data, dict):
+            raise ValueError("A request must be a JSON object")
+    except ValueError as e:
+        return {"error": f"Invalid request: {e}", "status": 400}
 
-    for thread in threads:
-        thread.join()
+    try:
+        response, status = app.search(data)
+    except Exception as e:
+        response, status = {"error": f"Query failed: {e}"}, 500
+    response["status"] = status
+    if 'id' in data:
+        response["id"] = data['id']  # Lets clients match pipelined responses to their requests
+    return response
 
-    if result:
-        common_doc_ids = set.intersection(*result)
-        return common_doc_ids
-    return set()
 
-
-def start_server(host, port):
+async def write_responses(writer, pending):
+    """Write the responses of a connection in the order of its requests, until the None sentinel."""
+    connected = True
+    while True:
+        response = await pending.get()
+        if response is None:
+            break
+        response = await response
+        if not connected:
+            continue  # Keep taking responses so the reader is never stuck on a full queue
+        try:
+            writer.write(json.dumps(response).encode('utf-8') + b'\n')
+            await writer.drain()
+        except ConnectionError:
+            connected = False  # The client went away, its reader sees the end of the stream
+
+
+async def handle_connection(reader, writer):
+    """
+    Serve a persistent connection speaking newline-delimited JSON: one request object per line, one
+    response object per line. Requests can be pipelined, they run concurrently and are answered in order.
+    """
+    loop = asyncio.get_running_loop()
+    pending = asyncio.Queue(maxsize=MAX_PIPELINED)
+    responses = asyncio.create_task(write_responses(writer, pending))
+    try:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                # The line is longer than MAX_LINE, the rest of the stream cannot be framed
+                error = loop.create_future()
+                error.set_result({"error": "Request line too long", "status": 400})
+                await pending.put(error)
+                break
+            except ConnectionError:
+                break
+            if not line:
+                break
+            if line.strip():
+                await pending.put(loop.run_in_executor(executor, answer, line))
+
+        await pending.put(None)
+        await responses
+    finally:
+        writer.close()
+
+
+async def start_server(host, port):
     """Starts the backend server to listen for queries."""
-
-    # Initialize hash tables
-    lexicon.read_from_file('files/lexicon.bin')
-    barrel_reader.load_offsets('barrels/inverted_index/offsets.bin')
-
-    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server.bind((host, port))
-    server.listen(5)
+    server = await asyncio.start_server(handle_connection, host, port, limit=MAX_LINE)
     print(f"Server listening on {host}:{port}")
-
-    while True:
-        client, address = server.accept()
-        print(f"Connection from {address}")
-        data = client.recv(1024).decode('utf-8')
-        if data:
-            query = json.loads(data).get('query', '')
-            if query:
-                common_doc_ids = handle_query(query)
-                response = json.dumps({"doc_ids": list(common_doc_ids)})
-                client.sendall(response.encode('utf-8'))
-        client.close()
+    async with server:
+        await server.serve_forever()
 
 
 if __name__ == "__main__":
-    start_server('127.0.0.1', 8080)
+    asyncio.run(start_server('127.0.0.1', 8080))
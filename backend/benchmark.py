@@ -0,0 +1,108 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import subprocess
+import http.client
+from multiprocessing import Pool
+
+# serve.py next to this script, started in the current directory where the files and barrels directories are
+SERVE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'serve.py')
+
+# Queries sent by the clients in turn, override them with --queries
+QUERIES = ["machine learning", "python", "data science", "startup", "design", "health", "writing tips", "blockchain"]
+
+
+def wait_until_listening(server, port, timeout=300):
+    """Wait for the server to accept connections (loading the index can take a while)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode} before listening")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Server did not start listening on port {port}")
+
+
+def run_client(port, queries, duration, client):
+    """Send queries over one keep-alive connection for duration seconds. Returns (requests, errors)."""
+    connection = http.client.HTTPConnection('127.0.0.1', port)
+    requests = errors = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        body = json.dumps({"query": queries[(client + requests) % len(queries)], "page_number": 1})
+        try:
+            connection.request('POST', '/query', body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status not in (200, 404):  # 404 is a query without results
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port)
+        requests += 1
+    connection.close()
+    return requests, errors
+
+
+def measure(workers, port, clients, queries, duration, cached):
+    """
+    Start serve.py with a number of workers and return the queries per second its clients got through.
+    Without cached, the result cache of the workers is disabled so that every query is executed.
+    """
+    env = dict(os.environ, GLOOBLE_WORKERS=str(workers), GLOOBLE_PORT=str(port))
+    if not cached:
+        env['GLOOBLE_QUERY_CACHE'] = '0'
+    server = subprocess.Popen([sys.executable, SERVE], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_listening(server, port)
+        with Pool(processes=clients) as pool:
+            pool.starmap(run_client, [(port, queries, 1, client) for client in range(clients)])  # Warm up
+            start = time.time()
+            results = pool.starmap(run_client, [(port, queries, duration, client) for client in range(clients)])
+            elapsed = time.time() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    requests = sum(count for count, _ in results)
+    errors = sum(count for _, count in results)
+    return requests / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure query throughput of serve.py for growing numbers of workers")
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help="worker counts to measure (default: 1, 2, 4, ... up to the number of cores)")
+    parser.add_argument('--clients', type=int, default=None, help="concurrent client processes (default: 2 per core)")
+    parser.add_argument('--duration', type=float, default=10, help="seconds measured per worker count")
+    parser.add_argument('--port', type=int, default=5100)
+    parser.add_argument('--queries', nargs='+', default=QUERIES)
+    parser.add_argument('--cache', choices=['off', 'on', 'both'], default='both',
+                        help="run the workers without the result cache, with it, or both in turn (default: both)")
+    args = parser.parse_args()
+
+    cores = os.cpu_count() or 1
+    workers = args.workers or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    clients = args.clients or 2 * cores
+
+    # Cached runs repeat the same few queries, so they mostly measure the HTTP server and the URL mapper reads
+    modes = {'off': [False], 'on': [True], 'both': [False, True]}[args.cache]
+    for cached in modes:
+        baseline = None
+        print(f"Result cache {'on' if cached else 'off'}")
+        print(f"{'workers':>7} {'queries/s':>10} {'speedup':>8} {'errors':>7}")
+        for count in workers:
+            throughput, errors = measure(count, args.port, clients, args.queries, args.duration, cached)
+            baseline = baseline or throughput
+            print(f"{count:>7} {throughput:>10.1f} {throughput / baseline:>7.2f}x {errors:>7}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
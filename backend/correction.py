@@ -1,31 +1,207 @@
-from textblob import TextBlob
 import re
-import time
+import zlib
+import threading
+import numpy as np
+import preprocessing
+from result_cache import ResultCache
 
-def correct_query(query):
-    """Handles the incoming query, performs spell check, and retrieves common docIDs and their details."""
-    start = time.time()
+# Highest number of edits between a misspelled word and its correction
+MAX_EDIT_DISTANCE = 2
 
-    # Split the query into words by non-alphanumeric characters (punctuation, spaces)
-    words = re.findall(r'\b\w+\b', query)  # This will match words consisting of letters or digits
+# Only the first PREFIX_LENGTH characters of a word are indexed, which bounds the number of deletes per word
+PREFIX_LENGTH = 7
 
-    # Create a TextBlob object from the query
-    blob = TextBlob(query)
+# Words shorter than this are never corrected, too many words are one or two edits away from them
+MIN_WORD_LENGTH = 3
 
-    corrected_query = str(blob.correct())  # Correct the entire query using TextBlob's correct method
+# Number of words read from the lexicon at a time while building the deletes index
+BUILD_CHUNK = 10000
 
-    # List to store (original_word, corrected_word) pairs
-    word_corrections = []
 
-    # Compare each word in the original query to its corrected version
-    for word in words:
-        # Create a TextBlob object for each word
-        word_blob = TextBlob(word)
-        corrected_word = str(word_blob.correct())
+def deletes(word, max_distance=MAX_EDIT_DISTANCE):
+    """The prefix of word and all the strings obtained by deleting up to max_distance characters from it."""
+    result = {word[:PREFIX_LENGTH]}
+    frontier = result
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        result = result | frontier
+    return result
 
-        # Only add to word_corrections if the word was actually corrected
-        if word != corrected_word:
-            word_corrections.append((word, corrected_word))
 
-    print(time.time() - start)
-    return corrected_query, word_corrections
+def delete_key(delete):
+    """
+    64-bit hash of a delete, the same in every process (unlike hash()) so the deletes index can be
+    saved in the startup snapshot.
+    """
+    encoded = delete.encode('utf-8')
+    return zlib.crc32(encoded) << 32 | zlib.adler32(encoded)
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal string alignment distance between a and b (insertions, deletions, substitutions and
+    transpositions of adjacent characters), or max_distance + 1 as soon as it is known to be larger.
+    Only the cells within max_distance of the diagonal are computed.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    limit = max_distance + 1  # Value of the cells outside the band
+    previous2 = None
+    previous = [j if j <= max_distance else limit for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [limit] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            cost = a[i - 1] != b[j - 1]
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous2[j - 2] + 1)
+            current[j] = min(value, limit)
+        if min(current) > max_distance:
+            return limit
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class SpellCorrector:
+    """
+    SymSpell-style corrector over the words of the lexicon. Every word is indexed under its deletes (see
+    deletes), so the candidates of a misspelled word are the words sharing one of its own deletes, and no
+    edits have to be generated at query time. Candidates are ranked by edit distance, then by document
+    frequency, so a correction always exists in the index.
+
+    The deletes index holds 64-bit hashes of the deletes (see delete_key) sorted in one array, with the wordID
+    of every entry in a parallel array. Hash collisions only add candidates, which the edit distance filters out.
+    """
+
+    def __init__(self, lexicon, index, cache_entries=4096):
+        self.lexicon = lexicon
+        self.index = index  # Anything with doc_frequency(wordID), e.g. a SegmentedIndex
+        self.keys = np.empty(0, dtype=np.uint64)  # Sorted hashes of the deletes
+        self.wordIDs = np.empty(0, dtype=np.uint32)  # WordID of every hash
+        self.added = {}  # Deletes of the words added after build: hash -> list of wordIDs
+        self.lock = threading.Lock()  # Guards self.added
+        self.ready = False  # Whether build has finished, words are not corrected before
+        self.cache = ResultCache(max_entries=cache_entries)  # Lowercase word -> correction (the word itself if none)
+
+    def build(self):
+        """Index the deletes of every word of the lexicon. Takes a while on a large lexicon, run it in a thread."""
+        keys, wordIDs = [], []
+        chunk_keys, chunk_ids = [], []
+        for word, wordID in self.lexicon.get_lexicon().items():
+            for delete in deletes(word):
+                chunk_keys.append(delete_key(delete))
+                chunk_ids.append(wordID)
+            if len(chunk_keys) >= BUILD_CHUNK * PREFIX_LENGTH:
+                keys.append(np.array(chunk_keys, dtype=np.uint64))
+                wordIDs.append(np.array(chunk_ids, dtype=np.uint32))
+                chunk_keys, chunk_ids = [], []
+        keys.append(np.array(chunk_keys, dtype=np.uint64))
+        wordIDs.append(np.array(chunk_ids, dtype=np.uint32))
+
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind='stable')
+        self.load(keys[order], np.concatenate(wordIDs)[order])
+
+    def load(self, keys, wordIDs):
+        """Use a deletes index built earlier, e.g. by the startup snapshot, instead of building it."""
+        self.keys, self.wordIDs = keys, wordIDs
+        self.ready = True
+
+    def add_word(self, word, wordID):
+        """Make a word added to the lexicon after build a possible correction."""
+        with self.lock:
+            for delete in deletes(word):
+                self.added.setdefault(delete_key(delete), []).append(wordID)
+
+    def candidates(self, word_deletes):
+        """WordIDs of the words indexed under one of the given deletes."""
+        hashes = np.array([delete_key(delete) for delete in word_deletes], dtype=np.uint64)
+        starts = np.searchsorted(self.keys, hashes, side='left')
+        ends = np.searchsorted(self.keys, hashes, side='right')
+
+        wordIDs = set()
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            wordIDs.update(self.wordIDs[start:end].tolist())
+        with self.lock:
+            for key in hashes.tolist():
+                wordIDs.update(self.added.get(key, ()))
+        return wordIDs
+
+    def suggest(self, word):
+        """The closest word of the lexicon to word, the most frequent one on ties, or None."""
+        best, best_key = None, None
+        seen = set()
+        level = {word[:PREFIX_LENGTH]}
+        for deleted in range(MAX_EDIT_DISTANCE + 1):
+            # Words not found yet are more than `deleted - 1` edits away, so they cannot beat a closer word
+            if best_key is not None and best_key[0] < deleted:
+                break
+            if deleted > 0:
+                level = {w[:i] + w[i + 1:] for w in level for i in range(len(w))}
+
+            for wordID in self.candidates(level) - seen:
+                seen.add(wordID)
+                candidate = self.lexicon.get_word(wordID)
+                if candidate is None:
+                    continue
+                max_distance = best_key[0] if best_key is not None else MAX_EDIT_DISTANCE
+                distance = edit_distance(word, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+
+                key = (distance, -self.index.doc_frequency(wordID))
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+    def is_inflection(self, word):
+        """
+        Whether the lemmas of a word are all in the lexicon, or it is a stopword. Only looks the word up in the
+        lemma dictionary: a misspelling is rarely in it, and falling back to spaCy would slow down every new one.
+        """
+        for token in preprocessing.clean_words([word]):
+            if token in preprocessing.custom_stopwords:
+                continue
+            lemma = preprocessing.lemma_dictionary.get(token)
+            if lemma is None or lemma and self.lexicon.get_word_id(lemma) is None:
+                return False
+        return True
+
+    def correct_word(self, word):
+        """Return the correction of a query word, or None if it needs none."""
+        word = word.lower()
+        if not self.ready or len(word) < MIN_WORD_LENGTH or not word.isalpha():
+            return None
+
+        # Fast path: words of the lexicon are never corrected
+        if self.lexicon.get_word_id(word) is not None:
+            return None
+
+        corrected = self.cache.get(word)
+        if corrected is None:
+            generation = self.cache.generation
+            if self.is_inflection(word):
+                corrected = word  # An inflection of indexed words, or a stopword
+            else:
+                corrected = self.suggest(word) or word
+            self.cache.put(word, corrected, generation)
+        return corrected if corrected != word else None
+
+    def correct_query(self, query):
+        """Correct every word of a query. Returns the corrected query and the (word, correction) pairs."""
+        word_corrections = []
+
+        def replace(match):
+            word = match.group(0)
+            corrected = self.correct_word(word)
+            if corrected is None:
+                return word
+            word_corrections.append((word, corrected))
+            return corrected
+
+        # Words are runs of letters or digits, punctuation and spaces are kept as they are
+        corrected_query = re.sub(r'\b\w+\b', replace, query)
+        return corrected_query, word_corrections
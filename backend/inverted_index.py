@@ -1,140 +1,510 @@
-import struct
+import mmap
 import os
+import re
+import shutil
+import numpy as np
+from scoring import IMPACT_VALUES
+
+# Decoded posting: document ordinal, context flags, frequency and quantized impact (see scoring.impact_scores)
+POSTING_DTYPE = np.dtype([('doc', '<u4'), ('flags', 'u1'), ('frequency', '<u2'), ('impact', 'u1')])
+
+# Number of postings in a compressed block, covered by one skip pointer and block-max score
+BLOCK_SIZE = 128
+
+# Block table entry of a barrel entry of more than one block: last document ordinal of the block (skip pointer),
+# byte offset of the block in the entry data and highest impact of the block (its block-max score)
+BLOCK_DTYPE = np.dtype([('last_doc', '<u4'), ('offset', '<u4'), ('max_impact', 'u1')])
+
+# Longest header of a barrel entry: wordID, doc count and length of the block data, varints of up to 5 bytes each
+MAX_ENTRY_HEADER = 15
+
+# Header bit-packed at the start of every block: bit widths of the document gaps (6 bits), context flags (3 bits),
+# frequencies (5 bits) and impacts (4 bits), then the lowest impact of the block (8 bits)
+BLOCK_HEADER_BITS = 26
+
+# Offsets metadata entry: wordID and offset of its entry in its barrel
+OFFSET_DTYPE = np.dtype([('wordID', '<u4'), ('offset', '<u4')])
+
+# Offset of a wordID without an entry
+NO_OFFSET = 0xFFFFFFFF
+
+# File in the barrels directory naming the generation directory of the current barrels and offsets.
+# Compaction writes a new generation next to the current one and switches to it by replacing this file.
+CURRENT_FILE = "CURRENT"
+
+
+def sort_postings(postings):
+    """Sort postings given in insertion order by document ordinal, keeping the last posting of every document."""
+    postings = postings[np.argsort(postings['doc'], kind='stable')]
+    return postings[np.append(postings['doc'][1:] != postings['doc'][:-1], True)]
+
+
+def merge_postings(postings_arrays):
+    """
+    Merge sorted postings arrays, given from oldest to newest, into one array sorted by document ordinal.
+    When a document occurs in several arrays (e.g. it was uploaded again), its newest posting is kept.
+    """
+    if len(postings_arrays) == 1:
+        return postings_arrays[0]
+    return sort_postings(np.concatenate(postings_arrays))
+
+
+def block_max_impacts(impacts):
+    """Highest impact of every block of BLOCK_SIZE postings, which bounds the scores of the block."""
+    if not len(impacts):
+        return np.empty(0, dtype=np.uint8)
+    return np.maximum.reduceat(impacts, np.arange(0, len(impacts), BLOCK_SIZE))
+
+
+def encode_varint(value):
+    """LEB128 encoding of an unsigned integer: 7 bits per byte, the high bit set on all but the last byte."""
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def decode_varint(buffer, offset):
+    """Read the varint (see encode_varint) at offset in buffer. Returns its value and the offset after it."""
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def bit_width(values):
+    """Number of bits needed by the largest value."""
+    return int(values.max()).bit_length() if len(values) else 0
+
+
+def pack_fields(fields):
+    """
+    Bit-pack (values, width) pairs one after the other into a single stream padded to a whole byte,
+    least significant bit first. Values of width 0 take no space.
+    """
+    bits = [((np.asarray(values, dtype=np.uint64)[:, None] >> np.arange(width, dtype=np.uint64)) & 1).ravel()
+            for values, width in fields if width]
+    if not bits:
+        return b''
+    return np.packbits(np.concatenate(bits).astype(np.uint8), bitorder='little').tobytes()
+
+
+def unpack_bits(data, bit_offsets, widths):
+    """Read one value of widths[i] bits (at most 32) at every bit_offsets[i] of a uint8 array."""
+    byte_offsets = bit_offsets >> 3
+    indices = np.minimum(byte_offsets[:, None] + np.arange(5), len(data) - 1)
+    words = (data[indices].astype(np.uint64) << (np.arange(5, dtype=np.uint64) * 8)).sum(axis=1, dtype=np.uint64)
+    masks = (np.uint64(1) << widths.astype(np.uint64)) - np.uint64(1)
+    return (words >> (bit_offsets & 7).astype(np.uint64)) & masks
+
+
+def encode_postings(postings):
+    """
+    Compress postings sorted by document ordinal into blocks of BLOCK_SIZE postings.
+
+    Every block is one bit stream padded to a whole byte: the block header (see BLOCK_HEADER_BITS), then the
+    gaps (ordinal - previous ordinal - 1, where the first gap is taken from the last ordinal of the previous
+    block), the context flags, the frequencies and the impacts minus the lowest impact of the block, each
+    packed at the smallest width that fits the block.
+
+    :return: The block table (see BLOCK_DTYPE) and the block data.
+    """
+    docs = postings['doc'].astype(np.int64)
+    table = np.zeros(-(-len(postings) // BLOCK_SIZE), dtype=BLOCK_DTYPE)
+    data = bytearray()
+
+    previous = -1
+    for block, start in enumerate(range(0, len(postings), BLOCK_SIZE)):
+        end = min(start + BLOCK_SIZE, len(postings))
+        gaps = np.diff(docs[start:end], prepend=previous) - 1
+        flags = postings['flags'][start:end] & 0xF
+        frequencies = postings['frequency'][start:end]
+        impacts = postings['impact'][start:end].astype(np.int64)
+        min_impact = int(impacts.min())
+        doc_width, flag_width = bit_width(gaps), bit_width(flags)
+        frequency_width, impact_width = bit_width(frequencies), bit_width(impacts - min_impact)
+        header = doc_width | flag_width << 6 | frequency_width << 9 | impact_width << 14 | min_impact << 18
+
+        table[block] = (docs[end - 1], len(data), impacts.max())
+        data += pack_fields([([header], BLOCK_HEADER_BITS), (gaps, doc_width), (flags, flag_width),
+                             (frequencies, frequency_width), (impacts - min_impact, impact_width)])
+        previous = docs[end - 1]
+
+    return table, bytes(data)
+
+
+def encode_entry(wordID, postings):
+    """
+    Serialize the barrel entry of wordID: a header (wordID, doc count and length of the block data, as varints),
+    the block table unless the postings fit in a single block, and the compressed blocks.
+    """
+    table, data = encode_postings(postings)
+    header = encode_varint(wordID) + encode_varint(len(postings)) + encode_varint(len(data))
+    return header + (table.tobytes() if len(table) > 1 else b'') + data
+
+
+def read_entry_header(buffer, offset=0):
+    """
+    Parse the header of the barrel entry at offset in buffer. Returns the wordID, the doc count,
+    the length of the block data and the offset of the block table, which the block data follows.
+    """
+    wordID, offset = decode_varint(buffer, offset)
+    doc_count, offset = decode_varint(buffer, offset)
+    data_length, offset = decode_varint(buffer, offset)
+    return wordID, doc_count, data_length, offset
+
+
+def table_size(doc_count):
+    """Size in bytes of the block table of an entry, which a single block goes without."""
+    num_blocks = -(-doc_count // BLOCK_SIZE)
+    return num_blocks * BLOCK_DTYPE.itemsize if num_blocks > 1 else 0
+
+
+def entry_end(buffer, offset=0):
+    """Offset right after the barrel entry at offset in buffer."""
+    _, doc_count, data_length, table_offset = read_entry_header(buffer, offset)
+    return table_offset + table_size(doc_count) + data_length
+
+
+class PostingsList:
+    """
+    Compressed postings of one word, sorted by document ordinal. Blocks are only decoded
+    when accessed, and the block table gives a skip pointer and a max score per block.
+    """
+
+    def __init__(self, doc_count, table, data):
+        self.doc_count = doc_count
+        self.table = table
+        self.data = data  # Block data as a uint8 array
+        self.skips = table['last_doc']  # Last document ordinal of every block
+        self.block_max = IMPACT_VALUES[table['max_impact']]  # Highest N-independent partial score of every block
+        self._postings = None
+
+    @classmethod
+    def from_postings(cls, postings):
+        """Wrap postings that are already decoded, e.g. merged from several segments, with a block table."""
+        table = np.zeros(-(-len(postings) // BLOCK_SIZE), dtype=BLOCK_DTYPE)
+        table['last_doc'] = postings['doc'][np.minimum(np.arange(1, len(table) + 1) * BLOCK_SIZE, len(postings)) - 1]
+        table['max_impact'] = block_max_impacts(postings['impact'])
+        postings_list = cls(len(postings), table, np.empty(0, dtype=np.uint8))
+        postings_list._postings = postings
+        return postings_list
+
+    @classmethod
+    def from_buffer(cls, buffer, offset=0):
+        """
+        Parse the barrel entry stored at offset in buffer, without copying it. An entry of a single block
+        has no block table: it is decoded right away, which gives its last ordinal and highest impact.
+        """
+        _, doc_count, data_length, offset = read_entry_header(buffer, offset)
+        num_blocks = -(-doc_count // BLOCK_SIZE)
+        if num_blocks > 1:
+            table = np.frombuffer(buffer, dtype=BLOCK_DTYPE, count=num_blocks, offset=offset)
+            data = np.frombuffer(buffer, dtype=np.uint8, count=data_length, offset=offset + table.nbytes)
+            return cls(doc_count, table, data)
+
+        data = np.frombuffer(buffer, dtype=np.uint8, count=data_length, offset=offset)
+        block = cls(doc_count, np.zeros(num_blocks, dtype=BLOCK_DTYPE), data)
+        return cls.from_postings(block.decode(np.arange(num_blocks)))
+
+    def __len__(self):
+        return self.doc_count
+
+    @property
+    def postings(self):
+        """All postings as a structured array (see POSTING_DTYPE), decoded on first access."""
+        if self._postings is None:
+            self._postings = self.decode(np.arange(len(self.table)))
+        return self._postings
+
+    def decode(self, blocks):
+        """Decode the given blocks (ascending block indices) in bulk into one structured array."""
+        counts = np.minimum(self.doc_count - blocks * BLOCK_SIZE, BLOCK_SIZE)
+        postings = np.empty(int(counts.sum()), dtype=POSTING_DTYPE)
+        if not len(postings):
+            return postings
+
+        # Layout of every block, in bits from the start of the data (see encode_postings)
+        starts = self.table['offset'][blocks].astype(np.int64) * 8
+        headers = unpack_bits(self.data, starts, np.full(len(blocks), BLOCK_HEADER_BITS)).astype(np.int64)
+        doc_widths, flag_widths, frequency_widths = headers & 0x3F, headers >> 6 & 0x7, headers >> 9 & 0x1F
+        impact_widths, min_impacts = headers >> 14 & 0xF, headers >> 18 & 0xFF
+        gap_starts = starts + BLOCK_HEADER_BITS
+        flag_starts = gap_starts + counts * doc_widths
+        frequency_starts = flag_starts + counts * flag_widths
+        impact_starts = frequency_starts + counts * frequency_widths
+
+        # Block of every posting and its index inside the block
+        block_of = np.repeat(np.arange(len(blocks)), counts)
+        first_of_block = np.cumsum(counts) - counts
+        index_in_block = np.arange(len(postings)) - first_of_block[block_of]
+
+        widths = doc_widths[block_of]
+        gaps = unpack_bits(self.data, gap_starts[block_of] + index_in_block * widths, widths).astype(np.int64) + 1
+        widths = flag_widths[block_of]
+        postings['flags'] = unpack_bits(self.data, flag_starts[block_of] + index_in_block * widths, widths)
+        widths = frequency_widths[block_of]
+        postings['frequency'] = unpack_bits(self.data, frequency_starts[block_of] + index_in_block * widths, widths)
+        widths = impact_widths[block_of]
+        postings['impact'] = (unpack_bits(self.data, impact_starts[block_of] + index_in_block * widths, widths) +
+                              min_impacts[block_of].astype(np.uint64))
+
+        # Ordinals are the running sum of the gaps, starting from the last ordinal of the previous block
+        previous = np.where(blocks > 0, self.skips[np.maximum(blocks - 1, 0)].astype(np.int64), -1)
+        running = np.cumsum(gaps)
+        postings['doc'] = running - (running[first_of_block] - gaps[first_of_block])[block_of] + previous[block_of]
+        return postings
+
+    def block_bounds(self, docs):
+        """
+        Block-max score of the block that could contain each of the sorted document ordinals, without
+        decoding anything. Returns the scores (0 outside the list) and a mask of the docs within its range.
+        """
+        blocks = np.searchsorted(self.skips, docs)
+        in_range = blocks < len(self.skips)
+        if not len(self.skips):
+            return np.zeros(len(docs), dtype=self.block_max.dtype), in_range
+        return np.where(in_range, self.block_max[np.minimum(blocks, len(self.skips) - 1)], 0), in_range
+
+    def find(self, docs):
+        """
+        Locate sorted document ordinals in the postings, decoding only the blocks that can contain them.
+        Returns the matching postings and a mask of the docs that were found.
+        """
+        blocks = np.unique(np.searchsorted(self.skips, docs))
+        blocks = blocks[blocks < len(self.skips)]
+        if not len(blocks):
+            return np.empty(0, dtype=POSTING_DTYPE), np.zeros(len(docs), dtype=bool)
+
+        block_postings = self.postings if self._postings is not None else self.decode(blocks)
+        matches = np.minimum(np.searchsorted(block_postings['doc'], docs), len(block_postings) - 1)
+        found = block_postings['doc'][matches] == docs
+        return block_postings[matches[found]], found
+
+
+def current_barrel_dir(output_dir):
+    """Directory of the current barrels: the generation named in CURRENT, or output_dir before the first compaction."""
+    try:
+        with open(os.path.join(output_dir, CURRENT_FILE), 'r') as file:
+            return os.path.join(output_dir, file.read().strip())
+    except FileNotFoundError:
+        return output_dir
+
+
+def fsync_dir(path):
+    """Force the entries of a directory (created, renamed or linked files) to disk."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
 
 class BarrelReader:
-    def __init__(self, num_barrels=60, output_dir="barrels/inverted_index"):
+    def __init__(self, num_barrels=60, output_dir="barrels/inverted_index", use_mmap=False):
         self.num_barrels = num_barrels  # Number of barrels
         self.output_dir = output_dir  # Directory where barrels and offsets are stored
-        self.offsets = {}  # Hash table to store wordID -> (barrel_index, offset) mapping
-
-    def load_offsets(self, offsets_file):
-        """Load the offsets metadata into memory."""
-        with open(offsets_file, 'rb') as file:
-            while True:
-                data = file.read(8)  # 4 bytes for wordID, 4 bytes for offset
-                if not data:
-                    break
-                wordID, offset = struct.unpack("<II", data)
-                self.offsets[wordID] = offset
-
-    def read_docIDs_and_scores(self, wordID, total_docs, max_frequencies):
-        """
-        Retrieve the list of docIDs and calculate their scores for the given wordID.
-        """
-        if wordID not in self.offsets:
-            return None  # WordID not found in metadata
+        self.barrel_dir = current_barrel_dir(output_dir)  # Generation of the barrels and offsets being read
+        self.offsets = np.empty(0, dtype=np.uint32)  # Offset of every wordID's entry in its barrel, or NO_OFFSET
+        self.use_mmap = use_mmap  # Map barrels into memory once instead of opening them per lookup
+        self.barrels = {}  # barrel_index -> mmap of the barrel file
+
+    @property
+    def offsets_file(self):
+        return os.path.join(self.barrel_dir, "offsets.bin")
+
+    def load_offsets(self):
+        """Load the offsets metadata (4 bytes wordID, 4 bytes offset per entry) into an array indexed by wordID."""
+        entries = np.fromfile(self.offsets_file, dtype=OFFSET_DTYPE)
+        self.offsets = np.full(int(entries['wordID'].max()) + 1 if len(entries) else 0, NO_OFFSET, dtype=np.uint32)
+        self.offsets[entries['wordID']] = entries['offset']
+
+    def get_offset(self, wordID):
+        """Offset of the entry of wordID in its barrel, or None if it has none."""
+        if wordID is None or not 0 <= wordID < len(self.offsets):
+            return None
+        offset = int(self.offsets[wordID])
+        return None if offset == NO_OFFSET else offset
+
+    def open_barrels(self):
+        """Memory-map every barrel file once so lookups no longer open files."""
+        for barrel_index in range(self.num_barrels):
+            self._map_barrel(barrel_index)
+
+    def _map_barrel(self, barrel_index):
+        barrel_filename = os.path.join(self.barrel_dir, f"barrel_{barrel_index}.bin")
+        if not os.path.exists(barrel_filename) or os.path.getsize(barrel_filename) == 0:
+            self.barrels.pop(barrel_index, None)  # Empty files cannot be mapped
+            return
+
+        with open(barrel_filename, 'rb') as file:
+            self.barrels[barrel_index] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _read_term(self, wordID):
+        """Return a buffer holding the barrel entry of wordID and the offset of the entry in it."""
+        offset = self.get_offset(wordID)
+        if offset is None:
+            return None, 0  # WordID not found in metadata
 
-        offset = self.offsets[wordID]
         barrel_index = wordID % self.num_barrels
-        barrel_filename = os.path.join(self.output_dir, f"barrel_{barrel_index}.bin")
 
+        if self.use_mmap:
+            return self.barrels.get(barrel_index), offset
+
+        barrel_filename = os.path.join(self.barrel_dir, f"barrel_{barrel_index}.bin")
         with open(barrel_filename, 'rb') as file:
             file.seek(offset)  # Move to the wordID's position
-            header_data = file.read(8)  # Read 4 bytes for wordID and 4 bytes for doc count
-            wordID_read, doc_count = struct.unpack("<II", header_data)
-
-            if wordID_read != wordID:
-                raise ValueError(f"Unexpected wordID read: {wordID_read} (expected: {wordID})")
-
-            # Calculate the number of documents containing the word
-            num_docs_with_word = doc_count
-
-            docIDs_and_scores = []
-
-            for _ in range(doc_count):
-                entry_data = file.read(11)  # 8 bytes docID, 1 byte context flags, 2 bytes frequency
-                docID, context_flags, frequency = struct.unpack("<QBH", entry_data)
-
-                # Determine context weight based on context flags
-                context_weight = 1  # Default context weight for text only
-                if context_flags & 0b0001:  # Title
-                    context_weight = 3
-                elif context_flags & 0b0010:  # Text
-                    context_weight = 1
-                elif context_flags & 0b0100:  # Tags
-                    context_weight = 2
-                elif context_flags & 0b1000:  # Authors
-                    context_weight = 2
-
-                # Calculate the score
-                max_freq = max_frequencies.get(docID, 1)  # Avoid division by zero
-                score = (
-                    (frequency / max_freq) *
-                    (total_docs / (1 + num_docs_with_word)) *
-                    context_weight
-                )
-
-                # Append the docID and its score to the result list
-                docIDs_and_scores.append((docID, score))
-
-        return docIDs_and_scores
-
-    def get_wordID_offset(self, wordID):
-        if wordID in self.offsets.keys():
-            return self.offsets[wordID]
-        return -1
-
-    def update_barrel_entry(self, wordID, new_doc_ID, word_data):
+            header_data = file.read(MAX_ENTRY_HEADER)
+            return header_data + file.read(max(entry_end(header_data) - len(header_data), 0)), 0
+
+    def doc_frequency(self, wordID):
+        """Return the number of documents containing wordID, reading only the entry header."""
+        offset = self.get_offset(wordID)
+        if offset is None:
+            return 0
+
+        barrel_index = wordID % self.num_barrels
+        if self.use_mmap:
+            barrel = self.barrels.get(barrel_index)
+            return 0 if barrel is None else read_entry_header(barrel, offset)[1]
+
+        barrel_filename = os.path.join(self.barrel_dir, f"barrel_{barrel_index}.bin")
+        with open(barrel_filename, 'rb') as file:
+            file.seek(offset)
+            return read_entry_header(file.read(MAX_ENTRY_HEADER))[1]
+
+    def read_postings_list(self, wordID):
         """
-        Update or append an entry for a wordID in the appropriate barrel and recalculate offsets.
+        Retrieve the compressed postings of the given wordID together with its block table.
+        In mmap mode the blocks are a view on the barrel and are only decoded where accessed.
         """
-        barrel_index = wordID % self.num_barrels
-        barrel_filename = os.path.join(self.output_dir, f"barrel_{barrel_index}.bin")
-        offsets_file = os.path.join(self.output_dir, "offsets.bin")
+        buffer, offset = self._read_term(wordID)
+        if buffer is None:
+            return None
+
+        wordID_read = read_entry_header(buffer, offset)[0]
+        if wordID_read != wordID:
+            raise ValueError(f"Unexpected wordID read: {wordID_read} (expected: {wordID})")
+
+        return PostingsList.from_buffer(buffer, offset)
+
+    def read_postings(self, wordID):
+        """
+        Retrieve the postings of the given wordID as a structured array
+        with the fields doc, flags, frequency and impact (see POSTING_DTYPE), sorted by document ordinal.
+        """
+        postings_list = self.read_postings_list(wordID)
+        return None if postings_list is None else postings_list.postings
 
-        # Load the entire barrel into memory
+    def read_barrel(self, barrel_index):
+        """Decode every entry of a barrel file into a dictionary of wordID -> postings array."""
+        barrel_filename = os.path.join(self.barrel_dir, f"barrel_{barrel_index}.bin")
         barrel_data = {}
+        if not os.path.exists(barrel_filename):
+            return barrel_data
+
         with open(barrel_filename, 'rb') as file:
-            while True:
-                header = file.read(8)  # 4 bytes wordID, 4 bytes doc count
-                if not header:
-                    break
-                curr_wordID, doc_count = struct.unpack("<II", header)
-                entries = [
-                    struct.unpack("<QBH", file.read(11))
-                    for _ in range(doc_count)
-                ]
-                barrel_data[curr_wordID] = entries
-
-        # Modify or add the entry for the given wordID
-        if wordID in barrel_data:
-            # Update the existing wordID entry
-            existing_entries = barrel_data[wordID]
-            for i, (docID, _, _) in enumerate(existing_entries):
-                if docID == new_doc_ID:
-                    existing_entries[i] = word_data  # Update the document data
-                    break
-            else:
-                existing_entries.append(word_data)  # Add new document data
-        else:
-            # Add a new wordID entry
-            barrel_data[wordID] = [word_data]
-
-        # Recalculate offsets and write back the updated barrel
+            data = file.read()
+        offset = 0
+        while offset < len(data):
+            wordID = read_entry_header(data, offset)[0]
+            barrel_data[wordID] = PostingsList.from_buffer(data, offset).postings
+            offset = entry_end(data, offset)
+        return barrel_data
+
+    def new_generation(self):
+        """Create the directory of the next generation of barrels, empty. Returns its path."""
+        match = re.fullmatch(r"generation_(\d+)", os.path.basename(self.barrel_dir))
+        generation_dir = os.path.join(self.output_dir, f"generation_{int(match.group(1)) + 1 if match else 1}")
+        shutil.rmtree(generation_dir, ignore_errors=True)  # Left by a compaction that crashed before switching
+        os.makedirs(generation_dir)
+        return generation_dir
+
+    def write_merged_barrel(self, barrel_index, updates, generation_dir):
+        """
+        Write a new version of a barrel to generation_dir, with the postings of updates
+        (wordID -> postings array, see merge_postings) merged into its entries.
+        Returns the offsets of the entries in the new barrel.
+        """
+        barrel_data = self.read_barrel(barrel_index)
+        for wordID, postings in updates.items():
+            barrel_data[wordID] = merge_postings([barrel_data[wordID], postings]) if wordID in barrel_data else postings
+
         new_offsets = {}
-        with open(barrel_filename, 'wb') as file:
+        with open(os.path.join(generation_dir, f"barrel_{barrel_index}.bin"), 'wb') as file:
             offset = 0
-            for curr_wordID, entries in sorted(barrel_data.items()):
-                # Write header: wordID and number of entries
-                header = struct.pack("<II", curr_wordID, len(entries))
-                file.write(header)
-                offset += len(header)
+            for wordID, postings in sorted(barrel_data.items()):
+                new_offsets[wordID] = offset
+                data = encode_entry(wordID, postings)
+                file.write(data)
+                offset += len(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return new_offsets
+
+    def install_generation(self, generation_dir, rewritten):
+        """
+        Switch to a generation whose rewritten barrels (barrel index -> offsets of their entries, see
+        write_merged_barrel) are written. The other barrels are linked into it and its offsets file is
+        written, then CURRENT is replaced in one atomic rename. A crash at any point leaves CURRENT naming
+        a complete generation, so barrels and offsets of different generations are never read together.
+        Live memory maps keep reading the old version, so postings lists that are already open stay valid.
+        """
+        for barrel_index in range(self.num_barrels):
+            barrel_filename = os.path.join(self.barrel_dir, f"barrel_{barrel_index}.bin")
+            if barrel_index not in rewritten and os.path.exists(barrel_filename):
+                os.link(barrel_filename, os.path.join(generation_dir, f"barrel_{barrel_index}.bin"))
+
+        offsets = self.offsets.copy()  # Lookups keep using the current offsets until the switch
+        for new_offsets in rewritten.values():
+            wordIDs = np.fromiter(new_offsets.keys(), dtype=np.uint32, count=len(new_offsets))
+            if len(wordIDs) and wordIDs.max() >= len(offsets):
+                grown = np.full(int(wordIDs.max()) + 1, NO_OFFSET, dtype=np.uint32)
+                grown[:len(offsets)] = offsets
+                offsets = grown
+            offsets[wordIDs] = np.fromiter(new_offsets.values(), dtype=np.uint32, count=len(new_offsets))
+        write_offsets(os.path.join(generation_dir, "offsets.bin"), offsets)
+        fsync_dir(generation_dir)
+
+        # The switch: CURRENT names the new generation from here on
+        current_filename = os.path.join(self.output_dir, CURRENT_FILE)
+        with open(current_filename + '.tmp', 'w') as file:
+            file.write(os.path.basename(generation_dir))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(current_filename + '.tmp', current_filename)
+        fsync_dir(self.output_dir)
 
-                # Write document entries
-                for entry in entries:
-                    doc_entry = struct.pack("<QBH", *entry)
-                    file.write(doc_entry)
-                    offset += len(doc_entry)
+        old_dir, self.barrel_dir, self.offsets = self.barrel_dir, generation_dir, offsets
+        if self.use_mmap:
+            self.open_barrels()
+        self.remove_generation(old_dir)
 
-                # Update the offsets for the current wordID
-                new_offsets[curr_wordID] = offset - len(header) - len(entries) * 11
+    def remove_generation(self, barrel_dir):
+        """Delete the files of a generation that is no longer current."""
+        if barrel_dir != self.output_dir:
+            shutil.rmtree(barrel_dir, ignore_errors=True)
+            return
 
-        # Merge new offsets with the in-memory offsets
-        self.offsets.update(new_offsets)
+        # The barrels written by the generation pipeline sit in the barrels directory itself, next to CURRENT
+        for filename in [f"barrel_{barrel_index}.bin" for barrel_index in range(self.num_barrels)] + ["offsets.bin"]:
+            if os.path.exists(os.path.join(barrel_dir, filename)):
+                os.remove(os.path.join(barrel_dir, filename))
 
-        # Write the updated offsets to the offsets.bin file
-        with open(offsets_file, 'wb') as file:
-            for curr_wordID, word_offset in sorted(self.offsets.items()):
-                file.write(struct.pack("<II", curr_wordID, word_offset))
 
+def write_offsets(offsets_file, offsets):
+    """Write an array of offsets indexed by wordID (see BarrelReader.offsets) to an offsets metadata file."""
+    wordIDs = np.flatnonzero(offsets != NO_OFFSET)
+    entries = np.zeros(len(wordIDs), dtype=OFFSET_DTYPE)
+    entries['wordID'] = wordIDs
+    entries['offset'] = offsets[wordIDs]
+    with open(offsets_file, 'wb') as file:
+        file.write(entries.tobytes())
+        file.flush()
+        os.fsync(file.fileno())
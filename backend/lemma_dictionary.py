@@ -0,0 +1,78 @@
+import os
+import mmap
+import bisect
+import struct
+import numpy as np
+
+# Header of the lemma dictionary file: magic, number of surface forms, length of the surface and lemma blobs
+LEMMA_HEADER = struct.Struct("<4sIII")
+LEMMA_MAGIC = b'GLEM'
+
+
+class LemmaDictionary:
+    """
+    Read-only map of normalized surface forms to their lemma, as produced by the generation pipeline.
+    The surface forms are sorted bytewise in one blob and the lemmas are stored in the same order in
+    another, each with an array of offsets. The lemma of a stopword is empty.
+    """
+
+    def __init__(self, buffer=None):
+        self.buffer = buffer
+        self.count = 0
+        if buffer is None:
+            return
+
+        magic, count, surface_length, lemma_length = LEMMA_HEADER.unpack_from(buffer, 0)
+        if magic != LEMMA_MAGIC:
+            raise ValueError("Not a lemma dictionary file")
+
+        offset = LEMMA_HEADER.size
+        self.surface_offsets = np.frombuffer(buffer, dtype='<u4', count=count + 1, offset=offset)
+        offset += (count + 1) * 4
+        self.lemma_offsets = np.frombuffer(buffer, dtype='<u4', count=count + 1, offset=offset)
+        offset += (count + 1) * 4
+        self.surface_start = offset
+        self.lemma_start = offset + surface_length
+        self.count = count
+
+    @classmethod
+    def read_from_file(cls, filename):
+        """Memory-map a lemma dictionary file, or return an empty dictionary if there is none."""
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            return cls()
+        with open(filename, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        """Encoded surface form at a sorted position, which lets bisect search the surface forms."""
+        start = self.surface_start + int(self.surface_offsets[position])
+        return self.buffer[start:self.surface_start + int(self.surface_offsets[position + 1])]
+
+    def get(self, surface):
+        """Return the lemma of a surface form, '' for a stopword, or None if the form was never seen."""
+        encoded = surface.encode('utf-8')
+        position = bisect.bisect_left(self, encoded)
+        if position == len(self) or self[position] != encoded:
+            return None
+        start = self.lemma_start + int(self.lemma_offsets[position])
+        return self.buffer[start:self.lemma_start + int(self.lemma_offsets[position + 1])].decode('utf-8')
+
+    @staticmethod
+    def write(filename, entries):
+        """Write (surface form, lemma) pairs to a lemma dictionary file."""
+        encoded = sorted((surface.encode('utf-8'), lemma.encode('utf-8')) for surface, lemma in entries)
+        surface_offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        surface_offsets[1:] = np.cumsum([len(surface) for surface, _ in encoded])
+        lemma_offsets = np.zeros(len(encoded) + 1, dtype='<u4')
+        lemma_offsets[1:] = np.cumsum([len(lemma) for _, lemma in encoded])
+
+        with open(filename + '.tmp', 'wb') as file:
+            file.write(LEMMA_HEADER.pack(LEMMA_MAGIC, len(encoded), int(surface_offsets[-1]), int(lemma_offsets[-1])))
+            file.write(surface_offsets.tobytes())
+            file.write(lemma_offsets.tobytes())
+            file.write(b''.join(surface for surface, _ in encoded))
+            file.write(b''.join(lemma for _, lemma in encoded))
+        os.replace(filename + '.tmp', filename)
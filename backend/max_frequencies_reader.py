@@ -1,12 +1,13 @@
 import os
 import struct
+import numpy as np
 
 
 def add_max_frequency_entry(docID, max_frequency, file_path='files/max_frequencies.bin'):
     """
-    Adds a new max_freq entry for a given docID and updates the total document count.
+    Sets the max_freq entry for a given document ordinal and updates the total document count.
 
-    :param docID: The document ID (int).
+    :param docID: The document ordinal (int).
     :param max_frequency: The maximum term frequency in the document (int).
     :param file_path: Path to the max_frequencies file.
     """
@@ -16,18 +17,20 @@ def add_max_frequency_entry(docID, max_frequency, file_path='files/max_frequenci
             with open(file_path, 'wb') as file:
                 file.write(struct.pack("<I", 0))  # Initial total_documents count
 
-        # Read current total_documents
         with open(file_path, 'rb+') as file:
-            total_documents = struct.unpack("<I", file.read(4))[0]
-            total_documents += 1
+            # A document ordinal past the end of the file is a new document
+            num_entries = (os.fstat(file.fileno()).st_size - 4) // 2
+            if docID >= num_entries:
+                total_documents = struct.unpack("<I", file.read(4))[0]
+                total_documents += 1
 
-            # Move the cursor back to update the total_documents
-            file.seek(0)
-            file.write(struct.pack("<I", total_documents))
+                # Move the cursor back to update the total_documents
+                file.seek(0)
+                file.write(struct.pack("<I", total_documents))
 
-            # Append the new docID and max_frequency at the end of the file
-            file.seek(0, os.SEEK_END)
-            file.write(struct.pack("<QH", docID, max_frequency))
+            # Write the max_frequency at the position of the document ordinal
+            file.seek(4 + docID * 2)
+            file.write(struct.pack("<H", max_frequency))
 
     except Exception as e:
         print(f"Error adding max frequency entry: {e}")
@@ -35,27 +38,19 @@ def add_max_frequency_entry(docID, max_frequency, file_path='files/max_frequenci
 
 def max_frequency_reader(file_path):
     """
-    Reads the max_frequencies file and returns the total number of documents and a hash table
-    of docIDs against their max frequencies.
+    Reads the max_frequencies file and returns the total number of documents and an array
+    of max frequencies indexed by document ordinal.
 
     :param file_path: Path to the max_frequencies file.
     :return: A tuple containing:
-             - total_documents (int): Total number of unique docIDs.
-             - doc_max_freq (dict): A dictionary mapping docID (int) to max frequency (int).
+             - total_documents (int): Total number of documents.
+             - max_frequencies (np.ndarray): uint16 array of max frequencies (2 bytes per document ordinal).
     """
-    doc_max_freq = {}
-
     with open(file_path, 'rb') as file:
-        # Read the first 4 bytes to get the total number of unique docIDs
+        # Read the first 4 bytes to get the total number of documents
         total_documents = struct.unpack("<I", file.read(4))[0]
 
-        # Read the rest of the file
-        while True:
-            data = file.read(10)  # 8 bytes for docID, 2 bytes for max frequency
-            if len(data) != 10:
-                break
-            # Unpack the docID and max frequency
-            docID, max_freq = struct.unpack("<QH", data)
-            doc_max_freq[docID] = max_freq
+        # Read the rest of the file as one array
+        max_frequencies = np.fromfile(file, dtype='<u2').astype(np.uint16)
 
-    return total_documents, doc_max_freq
+    return total_documents, max_frequencies
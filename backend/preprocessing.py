@@ -3,10 +3,14 @@ from nltk.tokenize import word_tokenize
 import re
 import unicodedata
 import inflect
+import threading
+from functools import lru_cache
+from lemma_dictionary import LemmaDictionary
 
 
-# Load spaCy model for lemmatization
-nlp = spacy.load("en_core_web_sm")
+# spaCy model for lemmatization, loaded on first use (see get_nlp)
+nlp = None
+nlp_lock = threading.Lock()
 
 # Initialize inflect engine for number-to-word conversion
 p = inflect.engine()
@@ -17,6 +21,12 @@ custom_stopwords = {"and", "or", "the", "a", "an", "in", "of", "on", "at", "for"
                     "can", "could", "would", "should", "do", "did", "done", "i", "you", "we", "he", "she", "they",
                     "them", "us", "about"}
 
+# Lemmas of the surface forms seen by the generation pipeline (see load_lemma_dictionary)
+lemma_dictionary = LemmaDictionary()
+
+# Words as NLTK's word_tokenize splits them in short texts: contractions lose their "n't", hyphenated words stay whole
+QUERY_WORD = re.compile(r"\w+(?=n't)|n't|\w+(?:-\w+)*")
+
 
 # Function to remove non-ASCII characters
 def clean_text(word):
@@ -35,16 +45,19 @@ def remove_accents(input_str):
     return ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
 
 
-def tokenize_text(text):
-    tokens = []
-
+def normalize_tokens(text):
+    """Split text into cleaned, lowercase ASCII tokens, ready to be lemmatized (steps 1 to 5)."""
     # Ensure input is a string; convert non-string to empty string
     if not isinstance(text, str):
         text = ""
 
     # Step 1: Tokenize the text
-    words = word_tokenize(text)
+    return clean_words(word_tokenize(text))
+
 
+def clean_words(words):
+    """Steps 2 to 5 of normalize_tokens."""
+    tokens = []
     for word in words:
         # Step 2: Convert numbers to words and remove numbers
         if word.isdigit():
@@ -71,11 +84,25 @@ def tokenize_text(text):
         cleaned_tokens.append(token)
 
     # Step 5: Remove non-ASCII characters and normalize accent characters
-    cleaned_tokens = [clean_text(remove_accents(token)) for token in cleaned_tokens if token]
+    return [clean_text(remove_accents(token)) for token in cleaned_tokens if token]
 
-    # Step 6: Lemmatize tokens using spaCy
+
+def get_nlp():
+    """
+    Load the spaCy model on first use, without the parser and entity recognizer that lemmas do not need.
+    Queries of words in the lemma dictionary never need it, so servers start without waiting for it.
+    """
+    global nlp
+    if nlp is None:
+        with nlp_lock:
+            if nlp is None:
+                nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
+    return nlp
+
+
+def lemmatize(doc):
+    """Lemmatized tokens of a spaCy doc, without stopwords (steps 6 and 7)."""
     lemmatized_tokens = []
-    doc = nlp(' '.join(cleaned_tokens))
     for token in doc:
         # Step 7: Remove stopwords
         if token.text not in custom_stopwords:
@@ -85,3 +112,40 @@ def tokenize_text(text):
             lemmatized_tokens.append(truncated_lemma)
 
     return lemmatized_tokens
+
+
+def tokenize_text(text):
+    # Step 6: Lemmatize tokens using spaCy
+    return lemmatize(get_nlp()(' '.join(normalize_tokens(text))))
+
+
+def load_lemma_dictionary(filename):
+    """Load the lemma dictionary written by the generation pipeline, used by tokenize_query."""
+    global lemma_dictionary
+    lemma_dictionary = LemmaDictionary.read_from_file(filename)
+    lemmatize_word.cache_clear()
+
+
+@lru_cache(maxsize=65536)
+def lemmatize_word(token):
+    """Lemmas of a normalized token, from the lemma dictionary or spaCy for tokens it has not seen."""
+    lemma = lemma_dictionary.get(token)
+    if lemma is not None:
+        return (lemma,) if lemma else ()  # The lemma of a stopword is empty
+    return tuple(lemmatize(get_nlp()(token)))
+
+
+def tokenize_query(text):
+    """
+    Tokenize a short text like tokenize_text, with a regex instead of NLTK and the lemma dictionary
+    instead of spaCy. Lemmas can differ from tokenize_text where spaCy's lemma depends on the context.
+    """
+    if not isinstance(text, str):
+        return []
+    return [lemma for token in clean_words(QUERY_WORD.findall(text)) for lemma in lemmatize_word(token)]
+
+
+def tokenize_texts(texts, batch_size=256):
+    """Tokenize many texts like tokenize_text, lemmatizing them in batches with nlp.pipe."""
+    docs = get_nlp().pipe((' '.join(normalize_tokens(text)) for text in texts), batch_size=batch_size)
+    return [lemmatize(doc) for doc in docs]
@@ -0,0 +1,171 @@
+from collections import Counter
+import threading
+import numpy as np
+
+# Number of candidates scored at a time by LazyRanking, in decreasing order of their upper bound
+EVALUATION_CHUNK = 256
+
+
+def plan_terms(barrel_reader, wordIDs):
+    """
+    Order the distinct wordIDs of a query from the rarest to the most common.
+    Returns the ordered wordIDs and the number of occurrences of each one, or None if
+    some word matches no document.
+    """
+    # Repeated words add their score once per occurrence
+    occurrences = Counter(wordIDs)
+    if not occurrences or None in occurrences:
+        return None  # A word missing from the lexicon matches no document
+
+    doc_frequencies = {wordID: barrel_reader.doc_frequency(wordID) for wordID in occurrences}
+    terms = sorted(occurrences, key=doc_frequencies.get)
+    if doc_frequencies[terms[0]] == 0:
+        return None
+    return terms, occurrences
+
+
+def intersect(scorer, postings_lists, multipliers, docs, scores):
+    """
+    Keep the sorted candidate docs that appear in every postings list and add their scores.
+    Stops as soon as no candidate is left.
+    """
+    for postings_list, multiplier in zip(postings_lists, multipliers):
+        if not len(docs):
+            break
+
+        postings, found = postings_list.find(docs)
+        _, term_scores = scorer.score(postings, len(postings_list))
+        docs = docs[found]
+        scores = scores[found] + term_scores * multiplier
+
+    return docs, scores
+
+
+class CandidateSet:
+    """
+    Candidate documents of a conjunctive query with an upper bound on their score.
+
+    Every document of the rarest postings list is a candidate, unless it lies outside the range of
+    another list. Its bound is the sum over all words of the block-max score of the block that could
+    contain it, times the idf of the word. Candidates can then be scored exactly in decreasing order
+    of their bound.
+
+    postings_lists can be an iterator: once no candidate is left, the remaining lists are not read.
+    """
+
+    def __init__(self, scorer, postings_lists, multipliers):
+        postings_lists = iter(postings_lists)
+        self.scorer = scorer
+        self.first = next(postings_lists)
+        self.postings_lists = []
+        self.multipliers = multipliers
+
+        # Upper bound of every candidate, dropping those outside the range of another list
+        candidates = np.asarray(self.first.postings['doc'])
+        positions = np.arange(len(candidates))
+        block_max, _ = self.first.block_bounds(candidates)
+        bounds = scorer.idf(len(self.first)) * multipliers[0] * block_max.astype(np.float64)
+        for postings_list, multiplier in zip(postings_lists, multipliers[1:]):
+            self.postings_lists.append(postings_list)
+            block_max, in_range = postings_list.block_bounds(candidates)
+            positions, candidates, bounds = positions[in_range], candidates[in_range], bounds[in_range]
+            bounds = bounds + scorer.idf(len(postings_list)) * multiplier * block_max[in_range]
+            if not len(candidates):
+                break  # No document can match, stop before reading the next list
+
+        self.positions = positions  # Position of every candidate in the rarest postings list
+        self.candidates = candidates  # Document ordinal of every candidate, ascending
+        self.bounds = bounds * (1 + 1e-9)  # Absorb rounding differences with the exact scores
+        self.order = np.argsort(-self.bounds, kind='stable')  # Candidate indices by decreasing bound
+
+    @classmethod
+    def from_query(cls, barrel_reader, scorer, wordIDs):
+        """Build the candidate set of the given wordIDs, or None if no document can match."""
+        plan = plan_terms(barrel_reader, wordIDs)
+        if plan is None:
+            return None
+        terms, occurrences = plan
+        candidate_set = cls(scorer, (barrel_reader.read_postings_list(wordID) for wordID in terms),
+                            [occurrences[wordID] for wordID in terms])
+        return candidate_set if len(candidate_set) else None
+
+    def __len__(self):
+        return len(self.order)
+
+    def bound(self, rank):
+        """Upper bound of the candidate at the given rank of self.order."""
+        return self.bounds[self.order[rank]]
+
+    def score(self, start, end):
+        """Score the candidates ranked start to end by bound. Returns the matching docs and their scores."""
+        # Candidates are in ascending document order, so sorted indices give sorted docs
+        chunk = np.sort(self.order[start:end])
+        _, scores = self.scorer.score(self.first.postings[self.positions[chunk]], len(self.first))
+        return intersect(self.scorer, self.postings_lists, self.multipliers[1:],
+                         self.candidates[chunk], scores * self.multipliers[0])
+
+    def count_matches(self, start):
+        """Count the matching documents among the candidates from the given rank on, without scoring them."""
+        docs = self.candidates[np.sort(self.order[start:])]
+        for postings_list in self.postings_lists:
+            docs = docs[postings_list.find(docs)[1]]
+        return len(docs)
+
+
+class LazyRanking:
+    """
+    Ranking of a conjunctive query that is only computed as far as it is read.
+
+    Candidates are scored chunk by chunk in decreasing order of their upper bound. A scored
+    document is final once its score is at least the bound of every unscored candidate,
+    so reading deeper pages only scores the chunks needed to settle them.
+    """
+
+    def __init__(self, candidate_set):
+        self.candidate_set = candidate_set
+        self.lock = threading.Lock()
+        self.next_rank = 0  # Rank (by bound) of the first unscored candidate
+        self.scored = 0  # Number of candidates scored so far
+        self.docs = np.empty(0, dtype=np.uint32)  # Matches scored so far, best first
+        self.scores = np.empty(0, dtype=np.float64)
+        self.exact_total = None
+
+    def _settled(self):
+        """Number of leading results that no unscored candidate can displace."""
+        if self.candidate_set is None or self.next_rank >= len(self.candidate_set):
+            return len(self.docs)
+        return int(np.count_nonzero(self.scores >= self.candidate_set.bound(self.next_rank)))
+
+    def top(self, k):
+        """Return the document ordinals and scores of the k best results, scoring more candidates if needed."""
+        with self.lock:
+            while self._settled() < k and self.next_rank < len(self.candidate_set or ()):
+                start = self.next_rank
+                docs, scores = self.candidate_set.score(start, start + EVALUATION_CHUNK)
+                self.next_rank = min(start + EVALUATION_CHUNK, len(self.candidate_set))
+                self.scored += self.next_rank - start
+
+                # Keep the matches ordered by decreasing score, then ascending ordinal
+                docs = np.concatenate([self.docs, docs])
+                scores = np.concatenate([self.scores, scores])
+                order = np.lexsort((docs, -scores))
+                self.docs, self.scores = docs[order], scores[order]
+
+            return self.docs[:k], self.scores[:k]
+
+    def total(self, exact=True):
+        """Number of matching documents, exact or estimated from the candidates scored so far."""
+        with self.lock:
+            if self.candidate_set is None:
+                return 0
+
+            remaining = len(self.candidate_set) - self.next_rank
+            if not remaining:
+                return len(self.docs)
+            if exact:
+                if self.exact_total is None:
+                    self.exact_total = len(self.docs) + self.candidate_set.count_matches(self.next_rank)
+                return self.exact_total
+            if not self.scored:
+                return remaining
+            return len(self.docs) + round(remaining * len(self.docs) / self.scored)
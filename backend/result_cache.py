@@ -0,0 +1,63 @@
+import threading
+from collections import OrderedDict
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of query results, shared by the request threads.
+
+    Every entry is tagged with the index generation it was computed for. Adding documents
+    bumps the generation, which turns every older entry into a miss.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # key -> (generation, value), least recently used first
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value of key, or None if it is missing or stale."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != self.generation:
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value, generation):
+        """
+        Store a value computed for the given generation (read before computing it).
+        Values computed before the last invalidation are dropped.
+        """
+        with self.lock:
+            if generation != self.generation:
+                return
+
+            self.entries[key] = (generation, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self):
+        """Mark every cached value as stale, e.g. after the index changed."""
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "generation": self.generation
+            }
@@ -0,0 +1,75 @@
+import numpy as np
+
+
+def context_weight(context_flags):
+    """Weight of a posting based on where the word occurs in the document."""
+    if context_flags & 0b0001:  # Title
+        return 3
+    elif context_flags & 0b0010:  # Text
+        return 1
+    elif context_flags & 0b0100:  # Tags
+        return 2
+    elif context_flags & 0b1000:  # Authors
+        return 2
+    return 1  # Default context weight for text only
+
+
+# Lookup table of context weights for every possible value of the 1-byte context flags
+CONTEXT_WEIGHTS = np.array([context_weight(flags) for flags in range(256)], dtype=np.float64)
+
+# Impacts quantize the N-independent part of a posting's score, (frequency / max_frequency) * context_weight,
+# on a log scale. Level 1 is the smallest partial score (frequency 1 out of 65535 in the text) and level
+# IMPACT_LEVELS the highest context weight. Every level is IMPACT_RATIO (about 1.049) times the previous one,
+# so a quantized partial score is within 2.4% of the exact one however small it is.
+IMPACT_LEVELS = 255
+MIN_PARTIAL_SCORE = 1 / 65535
+IMPACT_RATIO = (CONTEXT_WEIGHTS.max() / MIN_PARTIAL_SCORE) ** (1 / (IMPACT_LEVELS - 1))
+
+# Partial score of every impact level (level 0 is unused)
+IMPACT_VALUES = np.zeros(IMPACT_LEVELS + 1)
+IMPACT_VALUES[1:] = MIN_PARTIAL_SCORE * IMPACT_RATIO ** np.arange(IMPACT_LEVELS)
+
+
+def impact_scores(frequencies, flags, max_frequencies):
+    """Quantize the partial scores of postings into 1-byte impacts (1 to IMPACT_LEVELS)."""
+    partial_scores = frequencies / np.maximum(max_frequencies, 1) * CONTEXT_WEIGHTS[flags]
+    levels = np.rint(np.log(partial_scores / MIN_PARTIAL_SCORE) / np.log(IMPACT_RATIO)) + 1
+    return np.clip(levels, 1, IMPACT_LEVELS).astype(np.uint8)
+
+
+class TermScorer:
+    """
+    Scores whole postings lists with array operations:
+    score = (frequency / max_frequency) * (total_docs / (1 + doc_count)) * context_weight
+
+    The (frequency / max_frequency) * context_weight part is precomputed as the quantized impact of
+    every posting, so a term is scored by scaling the values of its impacts with a single idf factor.
+    """
+
+    def __init__(self, total_docs):
+        self.total_docs = total_docs
+
+    def idf(self, doc_count):
+        """Inverse document frequency factor of a word contained in doc_count documents."""
+        return self.total_docs / (1 + doc_count)
+
+    def score(self, postings, doc_count=None):
+        """
+        Score a postings array (see inverted_index.POSTING_DTYPE). doc_count is the number of documents
+        containing the word and defaults to the length of the postings.
+        Returns an array of unique document ordinals and an array of their summed scores.
+        """
+        if postings is None or len(postings) == 0:
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.float64)
+
+        docIDs = postings['doc']
+        idf = self.idf(len(postings) if doc_count is None else doc_count)
+        scores = IMPACT_VALUES[postings['impact']] * idf
+
+        # Postings are sorted by ordinal, so repeated documents sit next to each other
+        if len(docIDs) < 2 or (docIDs[1:] > docIDs[:-1]).all():
+            return np.asarray(docIDs), scores
+
+        # Add up the scores of repeated documents
+        unique_docIDs, inverse = np.unique(docIDs, return_inverse=True)
+        return unique_docIDs, np.bincount(inverse, weights=scores, minlength=len(unique_docIDs))
@@ -0,0 +1,224 @@
+import os
+import re
+import threading
+import numpy as np
+from inverted_index import (POSTING_DTYPE, PostingsList, encode_entry, entry_end, merge_postings, read_entry_header,
+                            sort_postings)
+from scoring import impact_scores
+
+# Number of buffered postings that makes the write buffer flush into a delta segment
+FLUSH_POSTINGS = 50000
+
+# Number of delta segments that starts a background compaction into the barrels
+MAX_DELTA_SEGMENTS = 4
+
+
+class DeltaSegment:
+    """Immutable file of barrel entries (see inverted_index.encode_entry) holding recently added postings."""
+
+    def __init__(self, path, postings):
+        self.path = path
+        self.postings = postings  # wordID -> postings array sorted by document ordinal
+
+    @classmethod
+    def read(cls, path):
+        with open(path, 'rb') as file:
+            data = file.read()
+
+        postings = {}
+        offset = 0
+        while offset < len(data):
+            wordID = read_entry_header(data, offset)[0]
+            postings[wordID] = PostingsList.from_buffer(data, offset).postings
+            offset = entry_end(data, offset)
+        return cls(path, postings)
+
+    @classmethod
+    def write(cls, path, postings):
+        """Write the postings (wordID -> postings array) to a new segment file."""
+        with open(path + '.tmp', 'wb') as file:
+            for wordID, word_postings in sorted(postings.items()):
+                file.write(encode_entry(wordID, word_postings))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(path + '.tmp', path)
+        return cls(path, postings)
+
+
+class OverlaidPostingsList:
+    """
+    Postings list of a word in the barrels overlaid with its recent postings from the delta segments and the
+    write buffer, where the newest posting of a document wins. Lookups probe both lists side by side, so the
+    blocks of the barrel list are still only decoded where needed instead of merging the two on every query.
+    """
+
+    def __init__(self, base, delta):
+        self.base = base  # PostingsList read from the barrels
+        self.delta = delta  # PostingsList of the recent postings (see PostingsList.from_postings)
+        self._postings = None
+
+        # Documents uploaded again have a posting in both lists but count once
+        _, replaced = base.find(delta.postings['doc'])
+        self.doc_count = len(base) + len(delta) - int(np.count_nonzero(replaced))
+
+    def __len__(self):
+        return self.doc_count
+
+    @property
+    def postings(self):
+        """All postings as a structured array (see POSTING_DTYPE), merged on first access."""
+        if self._postings is None:
+            self._postings = merge_postings([self.base.postings, self.delta.postings])
+        return self._postings
+
+    def block_bounds(self, docs):
+        """PostingsList.block_bounds over both lists: the higher block-max score of the two bounds a document."""
+        base_max, base_in_range = self.base.block_bounds(docs)
+        delta_max, delta_in_range = self.delta.block_bounds(docs)
+        return np.maximum(base_max, delta_max), base_in_range | delta_in_range
+
+    def find(self, docs):
+        """PostingsList.find over both lists, taking the recent posting of a document found in both."""
+        base_postings, base_found = self.base.find(docs)
+        delta_postings, delta_found = self.delta.find(docs)
+        postings = np.empty(len(docs), dtype=POSTING_DTYPE)
+        postings[base_found] = base_postings
+        postings[delta_found] = delta_postings
+        found = base_found | delta_found
+        return postings[found], found
+
+
+class SegmentedIndex:
+    """
+    Log-structured inverted index: the barrels of a BarrelReader, immutable delta segments and an
+    in-memory write buffer. New documents only go into the write buffer, which is flushed into a
+    delta segment once it holds FLUSH_POSTINGS postings. Reads overlay all three, and a background
+    compaction folds the delta segments into the barrels once there are MAX_DELTA_SEGMENTS of them.
+    """
+
+    def __init__(self, barrel_reader):
+        self.barrel_reader = barrel_reader
+        self.buffer = {}  # wordID -> list of posting tuples (see POSTING_DTYPE), in upload order
+        self.buffered = 0  # Number of postings in the buffer
+        self.lock = threading.Lock()  # Guards the buffer, the segment list and the barrel swap
+        self.compaction_lock = threading.Lock()  # Only one compaction runs at a time
+        self.compaction_thread = None
+
+        # Load the delta segments left by the previous run, oldest first
+        matches = (re.fullmatch(r"delta_(\d+)\.bin", filename) for filename in os.listdir(barrel_reader.output_dir))
+        numbers = sorted(int(match.group(1)) for match in matches if match)
+        self.segments = [DeltaSegment.read(self._segment_path(number)) for number in numbers]
+        self.next_segment = numbers[-1] + 1 if numbers else 0
+
+    def _segment_path(self, number):
+        return os.path.join(self.barrel_reader.output_dir, f"delta_{number}.bin")
+
+    def add_document(self, docID, word_data, max_frequency):
+        """
+        Buffer the postings of a document. word_data holds (wordID, context flags, frequency) tuples and
+        max_frequency is the highest frequency in the document, used to compute the impacts.
+        """
+        frequencies = np.array([frequency for _, _, frequency in word_data])
+        flags = np.array([context_flags for _, context_flags, _ in word_data], dtype=np.uint8)
+        impacts = impact_scores(frequencies, flags, max_frequency).tolist()
+
+        with self.lock:
+            for (wordID, context_flags, frequency), impact in zip(word_data, impacts):
+                self.buffer.setdefault(wordID, []).append((docID, context_flags, frequency, impact))
+            self.buffered += len(word_data)
+            if self.buffered >= FLUSH_POSTINGS:
+                self._flush()
+
+    def flush(self):
+        """Write the buffered postings to a new delta segment."""
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+
+        postings = {wordID: sort_postings(np.array(entries, dtype=POSTING_DTYPE))
+                    for wordID, entries in self.buffer.items()}
+        self.segments.append(DeltaSegment.write(self._segment_path(self.next_segment), postings))
+        self.next_segment += 1
+        self.buffer = {}
+        self.buffered = 0
+
+        if len(self.segments) >= MAX_DELTA_SEGMENTS:
+            self.start_compaction()
+
+    def start_compaction(self):
+        """Compact the delta segments in a background thread, unless a compaction is already running."""
+        if self.compaction_thread is not None and self.compaction_thread.is_alive():
+            return
+        self.compaction_thread = threading.Thread(target=self.compact, daemon=True)
+        self.compaction_thread.start()
+
+    def compact(self):
+        """
+        Fold the current delta segments into the barrels. The barrels are rewritten into a new generation
+        without holding the lock; only switching to it and dropping the segments blocks readers.
+        """
+        with self.compaction_lock:
+            with self.lock:
+                segments = list(self.segments)
+            if not segments:
+                return
+
+            # Postings of every word over all the segments, newest last
+            updates = {}
+            for segment in segments:
+                for wordID, postings in segment.postings.items():
+                    updates.setdefault(wordID, []).append(postings)
+            updates = {wordID: merge_postings(postings) for wordID, postings in updates.items()}
+
+            # The affected barrels are rewritten into a new generation, the current one stays untouched
+            num_barrels = self.barrel_reader.num_barrels
+            generation_dir = self.barrel_reader.new_generation()
+            rewritten = {}
+            for barrel_index in sorted({wordID % num_barrels for wordID in updates}):
+                barrel_updates = {wordID: postings for wordID, postings in updates.items()
+                                  if wordID % num_barrels == barrel_index}
+                rewritten[barrel_index] = self.barrel_reader.write_merged_barrel(barrel_index, barrel_updates,
+                                                                                 generation_dir)
+
+            with self.lock:
+                self.barrel_reader.install_generation(generation_dir, rewritten)
+                self.segments = [segment for segment in self.segments if segment not in segments]
+
+            for segment in segments:
+                os.remove(segment.path)
+
+    def _delta_postings(self, wordID):
+        """Postings arrays of wordID in the delta segments and the write buffer, oldest first."""
+        deltas = [segment.postings[wordID] for segment in self.segments if wordID in segment.postings]
+        if wordID in self.buffer:
+            deltas.append(sort_postings(np.array(self.buffer[wordID], dtype=POSTING_DTYPE)))
+        return deltas
+
+    def doc_frequency(self, wordID):
+        """Return the number of documents containing wordID (documents uploaded again count twice)."""
+        with self.lock:
+            return (self.barrel_reader.doc_frequency(wordID) +
+                    sum(len(postings) for postings in self._delta_postings(wordID)))
+
+    def read_postings_list(self, wordID):
+        """
+        Retrieve the postings list of wordID over the barrels and the delta segments.
+        Words without recent postings are served straight from the barrels, the recent postings
+        of other words are merged into a small list that overlays the one of the barrels.
+        """
+        with self.lock:
+            base = self.barrel_reader.read_postings_list(wordID)
+            deltas = self._delta_postings(wordID)
+        if not deltas:
+            return base
+
+        delta = PostingsList.from_postings(merge_postings(deltas))
+        return delta if base is None else OverlaidPostingsList(base, delta)
+
+    def read_postings(self, wordID):
+        """Retrieve the postings of wordID as a structured array (see POSTING_DTYPE)."""
+        postings_list = self.read_postings_list(wordID)
+        return None if postings_list is None else postings_list.postings
@@ -0,0 +1,82 @@
+import os
+import gc
+import sys
+import signal
+import socket
+from werkzeug.serving import make_server
+
+# The workers only answer queries. The index is loaded once here, in the parent, and the forked workers
+# share its memory-mapped barrels and lookup tables copy-on-write instead of loading their own.
+os.environ['GLOOBLE_READ_ONLY'] = '1'
+import app  # noqa: E402
+import preprocessing  # noqa: E402
+
+# Number of worker processes, one per core by default
+WORKERS = int(os.environ.get('GLOOBLE_WORKERS', os.cpu_count() or 1))
+
+# Connections waiting to be accepted by a worker
+LISTEN_BACKLOG = 1024
+
+
+def run_worker(listener, host, port):
+    """Serve requests accepted from the shared listening socket until the worker is terminated."""
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C reaches the whole group, the parent stops the workers
+    server = make_server(host, port, app.app, threaded=True, fd=listener.fileno())
+    server.serve_forever()
+
+
+def serve(host='0.0.0.0', port=5000, workers=WORKERS):
+    """
+    Bind the listening socket, fork the worker processes and restart any worker that dies.
+    The kernel hands every connection of the shared socket to one of the workers. Unix only.
+    """
+    listener = socket.create_server((host, port), backlog=LISTEN_BACKLOG)
+
+    # Wait for spaCy in the parent so the workers share it; a fork must not happen while a thread is loading it
+    preprocessing.get_nlp()
+
+    # Objects created so far are never collected again, so the collector of a worker does not touch
+    # (and copy) the pages of the parent's objects
+    gc.freeze()
+
+    children = set()
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(listener, host, port)
+            finally:
+                os._exit(0)
+        children.add(pid)
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        spawn()
+    print(f"Serving on {host}:{port} with {workers} workers", flush=True)
+
+    while children:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited, starting a new one", file=sys.stderr, flush=True)
+            spawn()
+    listener.close()
+
+
+# Run the query servers
+if __name__ == "__main__":
+    serve(port=int(os.environ.get('GLOOBLE_PORT', 5000)))
@@ -0,0 +1,173 @@
+import os
+import mmap
+import time
+import struct
+import numpy as np
+from Lexicon import Lexicon
+from inverted_index import BarrelReader
+from URLMapper import URLMapper
+from DocumentTable import DocumentTable
+from max_frequencies_reader import max_frequency_reader
+from correction import SpellCorrector
+
+# Header of the snapshot file: magic, format version, number of source files and number of tables
+SNAPSHOT_HEADER = struct.Struct("<4sIII")
+SNAPSHOT_MAGIC = b'GSNP'
+
+# Bumped whenever the tables or their layout change, older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+
+# Source file entry: path, size and modification time, a snapshot is only used while they all match
+SOURCE_ENTRY = struct.Struct("<64sQQ")
+
+# Table entry: name, NumPy dtype, byte offset of the data in the file and number of items
+TABLE_ENTRY = struct.Struct("<32s8sQQ")
+
+# Table data starts at multiples of this, so every array is aligned for its dtype
+ALIGNMENT = 64
+
+SNAPSHOT_FILE = 'files/snapshot.bin'
+
+# Files the tables are computed from, along with the offsets file of the current barrel generation
+SNAPSHOT_SOURCES = ['files/lexicon.bin', 'files/lexicon.log', 'files/documents.bin', 'files/offsets.bin',
+                    'files/max_frequencies.bin']
+
+
+def source_stats(sources):
+    """(path, size, modification time) of every source file, zeros for a missing file."""
+    stats = []
+    for path in sources:
+        try:
+            stat = os.stat(path)
+            stats.append((path, stat.st_size, stat.st_mtime_ns))
+        except FileNotFoundError:
+            stats.append((path, 0, 0))
+    return stats
+
+
+class Snapshot:
+    """
+    Versioned file holding the lookup tables that are otherwise computed from several files at startup:
+    the barrel offsets by wordID, the document table and its sorted order, the URL mapper offsets, the
+    number of documents and the deletes index of the spelling corrector. The file is memory-mapped and
+    every table is an array over the mapping, so loading it reads nothing until the tables are used.
+
+    The mapping is copy-on-write: tables updated by uploads copy only the pages they change, and
+    processes forked after loading share the untouched pages.
+    """
+
+    def __init__(self, buffer):
+        magic, version, source_count, table_count = SNAPSHOT_HEADER.unpack_from(buffer, 0)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("Not a snapshot file")
+        self.buffer = buffer
+        self.version = version
+        self.sources = []
+        self.tables = {}
+        if version != SNAPSHOT_VERSION:
+            return
+
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(source_count):
+            path, size, mtime = SOURCE_ENTRY.unpack_from(buffer, offset)
+            self.sources.append((path.rstrip(b'\0').decode('utf-8'), size, mtime))
+            offset += SOURCE_ENTRY.size
+        for _ in range(table_count):
+            name, dtype, data_offset, count = TABLE_ENTRY.unpack_from(buffer, offset)
+            self.tables[name.rstrip(b'\0').decode('utf-8')] = (dtype.rstrip(b'\0').decode('ascii'), data_offset, count)
+            offset += TABLE_ENTRY.size
+
+    @classmethod
+    def read_from_file(cls, filename):
+        """Memory-map a snapshot file, or return None if there is none."""
+        if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+            return None
+        with open(filename, 'rb') as file:
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY))
+
+    def is_current(self):
+        """Whether the snapshot has the current version and the source files have not changed since it was taken."""
+        return self.version == SNAPSHOT_VERSION and self.sources == source_stats(path for path, _, _ in self.sources)
+
+    def __getitem__(self, name):
+        dtype, offset, count = self.tables[name]
+        return np.frombuffer(self.buffer, dtype=dtype, count=count, offset=offset)
+
+    @staticmethod
+    def write(filename, tables, sources):
+        """Write named arrays to a snapshot file, with the (path, size, modification time) of its sources."""
+        tables = {name: np.ascontiguousarray(array) for name, array in tables.items()}
+        offset = SNAPSHOT_HEADER.size + len(sources) * SOURCE_ENTRY.size + len(tables) * TABLE_ENTRY.size
+
+        entries = []
+        for name, array in tables.items():
+            offset = -(-offset // ALIGNMENT) * ALIGNMENT
+            entries.append(TABLE_ENTRY.pack(name.encode('utf-8'), array.dtype.str.encode('ascii'), offset, len(array)))
+            offset += array.nbytes
+
+        with open(filename + '.tmp', 'wb') as file:
+            file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(sources), len(tables)))
+            for path, size, mtime in sources:
+                file.write(SOURCE_ENTRY.pack(path.encode('utf-8'), size, mtime))
+            file.write(b''.join(entries))
+            for array in tables.values():
+                file.write(b'\0' * (-file.tell() % ALIGNMENT))
+                file.write(array.tobytes())
+        os.replace(filename + '.tmp', filename)
+
+
+def load_snapshot(filename=SNAPSHOT_FILE):
+    """Return the snapshot if it is up to date with the files, otherwise None."""
+    snapshot = Snapshot.read_from_file(filename)
+    if snapshot is not None and not snapshot.is_current():
+        print(f"Ignoring {filename}, the files changed since it was taken")
+        return None
+    return snapshot
+
+
+def restore(snapshot, barrel_reader, documents, url_mapper, corrector):
+    """Set up the components from the tables of a snapshot. Returns the number of documents."""
+    barrel_reader.offsets = snapshot['barrel_offsets']
+    documents.file_path = 'files/documents.bin'
+    documents.doc_ids = snapshot['doc_ids']
+    documents.sorted_doc_ids = snapshot['sorted_doc_ids']
+    documents.sorted_ordinals = snapshot['sorted_ordinals']
+    url_mapper.offsets = snapshot['url_offsets']
+    corrector.load(snapshot['correction_keys'], snapshot['correction_wordIDs'])
+    return int(snapshot['num_documents'][0])
+
+
+def take_snapshot(filename=SNAPSHOT_FILE):
+    """Load the components from their files, build the corrector and write their tables to a snapshot."""
+    barrel_reader = BarrelReader(use_mmap=True)
+    sources = source_stats(SNAPSHOT_SOURCES + [barrel_reader.offsets_file])  # A file changing later makes it stale
+
+    lexicon = Lexicon()
+    lexicon.read_from_file('files/lexicon.bin')
+    lexicon.read_log('files/lexicon.log')
+    barrel_reader.load_offsets()
+    url_mapper = URLMapper()
+    url_mapper.read_offsets_from_file('files/offsets.bin')
+    documents = DocumentTable()
+    documents.read_from_file('files/documents.bin')
+    num_documents, _ = max_frequency_reader('files/max_frequencies.bin')
+    corrector = SpellCorrector(lexicon, None)  # Building the deletes index needs no document frequencies
+    corrector.build()
+
+    Snapshot.write(filename, {
+        'barrel_offsets': barrel_reader.offsets,
+        'doc_ids': documents.doc_ids,
+        'sorted_doc_ids': documents.sorted_doc_ids,
+        'sorted_ordinals': documents.sorted_ordinals,
+        'url_offsets': url_mapper.offsets,
+        'num_documents': np.array([num_documents], dtype=np.uint64),
+        'correction_keys': corrector.keys,
+        'correction_wordIDs': corrector.wordIDs,
+    }, sources)
+
+
+# Run from the backend directory after generating the index, and again whenever its files change
+if __name__ == "__main__":
+    start = time.time()
+    take_snapshot()
+    print(f"Wrote {SNAPSHOT_FILE} in {time.time() - start:.1f}s")
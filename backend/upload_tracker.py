@@ -0,0 +1,37 @@
+import threading
+from collections import OrderedDict
+
+# Indexing states of an uploaded document
+QUEUED = "queued"  # Logged, waiting to be indexed
+INDEXED = "indexed"  # Visible to queries
+FAILED = "failed"  # Could not be indexed
+
+
+class UploadTracker:
+    """
+    Indexing state of recent uploads, keyed by document ID and shared by the request threads and the indexer.
+    Every state is tagged with the log sequence number of its upload, so an older upload of the same
+    document never overwrites the state of a newer one. Only the last max_entries documents are kept.
+    """
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # doc_id -> (sequence number, state, error), oldest first
+        self.lock = threading.Lock()
+
+    def update(self, doc_id, lsn, state, error=None):
+        """Record the state of the upload with sequence number lsn, unless a newer upload is tracked."""
+        with self.lock:
+            entry = self.entries.get(doc_id)
+            if entry is not None and (entry[0] > lsn or (entry[0] == lsn and state == QUEUED)):
+                return  # Keep the state of a newer upload, or of an upload already indexed
+
+            self.entries[doc_id] = (lsn, state, error)
+            self.entries.move_to_end(doc_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def get(self, doc_id):
+        """Return the (sequence number, state, error) of a tracked document, or None."""
+        with self.lock:
+            return self.entries.get(doc_id)
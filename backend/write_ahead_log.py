@@ -0,0 +1,139 @@
+import os
+import re
+import json
+import zlib
+import struct
+import threading
+
+# Header of a log record: 8 bytes sequence number, 4 bytes payload length, 4 bytes CRC-32 of the payload
+RECORD_HEADER = struct.Struct("<QII")
+
+# Size in bytes after which the log moves on to a new segment file
+SEGMENT_BYTES = 16 * 1024 * 1024
+
+
+def fsync_paths(paths):
+    """Force the given files to disk, skipping the ones that do not exist."""
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as file:
+                os.fsync(file.fileno())
+
+
+def read_records(path):
+    """Return the (sequence number, record) pairs of a log segment, stopping at a torn or corrupt record."""
+    with open(path, 'rb') as file:
+        data = file.read()
+
+    records = []
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        lsn, length, checksum = RECORD_HEADER.unpack_from(data, offset)
+        payload = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break  # The write was cut short by a crash
+        records.append((lsn, json.loads(payload)))
+        offset += RECORD_HEADER.size + length
+    return records
+
+
+class WriteAheadLog:
+    """
+    Append-only log of JSON records split into segment files, with group commit: while one thread
+    writes and fsyncs a batch, the records appended by other threads queue up and go out together
+    in the next batch. Committed records are handed to on_commit in sequence order.
+    """
+
+    def __init__(self, directory, on_commit):
+        self.directory = directory
+        self.on_commit = on_commit  # Called with (sequence number, record) once a record is durable
+        self.lock = threading.Lock()
+        self.committed = threading.Condition(self.lock)
+        self.pending = []  # (sequence number, record, encoded record) waiting for the next batch
+        self.flushing = False  # Whether a thread is writing a batch
+        self.closed_segments = []  # (path, last sequence number) of full segments, oldest first
+
+        # Records of the previous run that may not have been applied yet
+        os.makedirs(directory, exist_ok=True)
+        self.recovered = []
+        for number in self._segment_numbers():
+            path = self._segment_path(number)
+            records = read_records(path)
+            self.recovered.extend(records)
+            self.closed_segments.append((path, records[-1][0] if records else -1))
+
+        self.next_lsn = self.recovered[-1][0] + 1 if self.recovered else 0
+        self.durable_lsn = self.next_lsn - 1  # Highest sequence number on disk
+        self.segment_number = self._segment_numbers()[-1] + 1 if self.closed_segments else 0
+        self.file = open(self._segment_path(self.segment_number), 'ab')
+
+    def _segment_numbers(self):
+        matches = (re.fullmatch(r"wal_(\d+)\.log", filename) for filename in os.listdir(self.directory))
+        return sorted(int(match.group(1)) for match in matches if match)
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"wal_{number}.log")
+
+    def append(self, record):
+        """Append a JSON-serializable record and return its sequence number once it is on disk."""
+        payload = json.dumps(record).encode('utf-8')
+        with self.lock:
+            lsn = self.next_lsn
+            self.next_lsn += 1
+            self.pending.append((lsn, record, RECORD_HEADER.pack(lsn, len(payload), zlib.crc32(payload)) + payload))
+
+            while self.durable_lsn < lsn:
+                if self.flushing:
+                    self.committed.wait()  # Another thread is writing, our record goes in the next batch
+                else:
+                    self._write_batch()
+        return lsn
+
+    def _write_batch(self):
+        """Write and fsync all pending records. Called with the lock held, which is released during the I/O."""
+        batch, self.pending = self.pending, []
+        self.flushing = True
+        self.lock.release()
+        try:
+            self.file.write(b''.join(data for _, _, data in batch))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except Exception:
+            with self.lock:
+                self.pending = batch + self.pending  # Left for the next batch to retry
+            raise
+        finally:
+            self.lock.acquire()
+            self.flushing = False
+            self.committed.notify_all()
+
+        self.durable_lsn = batch[-1][0]
+        for lsn, record, _ in batch:
+            self.on_commit(lsn, record)
+
+        if self.file.tell() >= SEGMENT_BYTES:
+            self._rotate()
+
+    def _rotate(self):
+        """Close the current segment and start a new one. Called with the lock held."""
+        self.file.close()
+        self.closed_segments.append((self._segment_path(self.segment_number), self.durable_lsn))
+        self.segment_number += 1
+        self.file = open(self._segment_path(self.segment_number), 'ab')
+
+    def releasable(self, applied_lsn):
+        """Whether a full segment only holds records up to applied_lsn."""
+        with self.lock:
+            return any(last_lsn <= applied_lsn for _, last_lsn in self.closed_segments)
+
+    def release(self, applied_lsn):
+        """
+        Delete the full segments whose records are all applied up to applied_lsn.
+        Call only once the state holding these records has been written to disk.
+        """
+        with self.lock:
+            released = [path for path, last_lsn in self.closed_segments if last_lsn <= applied_lsn]
+            self.closed_segments = [(path, last_lsn) for path, last_lsn in self.closed_segments
+                                    if last_lsn > applied_lsn]
+        for path in released:
+            os.remove(path)
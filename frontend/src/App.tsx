@@ -20,11 +20,12 @@ export default function App() {
   const [isLoading, setIsLoading] = useState(false);
   const [currentQuery, setCurrentQuery] = useState('');
   const [totalResults, setTotalResults] = useState(0);
+  const [cursor, setCursor] = useState<string | undefined>(undefined);
   const [uploadStatus, setUploadStatus] = useState<{ show: boolean; success: boolean }>({
     show: false,
     success: false
   });
-  const fetchResults = async (query: string, page: number, useOriginal = false) => {
+  const fetchResults = async (query: string, page: number, useOriginal = false, resultCursor?: string) => {
     try {
       console.log('Fetching results:', { query, page, useOriginal });
 
@@ -37,7 +38,8 @@ export default function App() {
           query: query.trim(),
           use_original: useOriginal,
           page_number: page,
-          per_page: ITEMS_PER_PAGE
+          per_page: ITEMS_PER_PAGE,
+          cursor: resultCursor
         }),
       });
 
@@ -61,6 +63,7 @@ export default function App() {
       setHasSearched(false);
       setCurrentQuery('');
       setTotalResults(0);
+      setCursor(undefined);
       return;
     }
 
@@ -81,10 +84,12 @@ export default function App() {
 
       setResults(data.results || []);
       setTotalResults(data.total_results || 0);
+      setCursor(data.cursor);
     } else { 
       setResults([]);
       setCorrections([]);
       setTotalResults(0);
+      setCursor(undefined);
     } 
     setIsLoading(false);
   };
@@ -93,7 +98,7 @@ export default function App() {
     setIsLoading(true);
     window.scrollTo({ top: 0, behavior: 'smooth' });
     
-    const data = await fetchResults(currentQuery, newPage);
+    const data = await fetchResults(currentQuery, newPage, false, cursor);
     
     if (data) {
       setResults(data.results || []);
@@ -10,6 +10,7 @@ export interface SearchResponse {
   results: SearchResult[];
   corrections?: [string, string][];
   total_results: number;
+  cursor?: string;
 }
 
 export interface SearchRequest {
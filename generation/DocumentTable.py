@@ -0,0 +1,46 @@
+import math
+import numpy as np
+
+
+def sanitize_value(value):
+    """
+    Convert value to a string if not NaN, otherwise return an empty string.
+    The docID of a document is the hash of its sanitized URL, in ingestion.py and url_mapper_generation.py alike.
+    """
+    return str(value) if not (value is None or isinstance(value, float) and math.isnan(value)) else ""
+
+
+class DocumentTable:
+    def __init__(self):
+        self.doc_ids = []  # List of SHA docIDs indexed by document ordinal
+        self.id_to_ordinal = {}  # Dictionary for reverse lookup, only used while building
+
+    def add_document(self, docID):
+        """
+        Assign the next dense ordinal to a document.
+        :param docID: First 8 bytes of the SHA-256 of the document URL.
+        :return: The new ordinal, or None if the document was already added.
+        """
+        if docID in self.id_to_ordinal:
+            return None
+        ordinal = len(self.doc_ids)
+        self.doc_ids.append(docID)
+        self.id_to_ordinal[docID] = ordinal
+        return ordinal
+
+    def get_ordinal(self, docID):
+        return self.id_to_ordinal.get(docID, None)
+
+    def get_docID(self, ordinal):
+        return self.doc_ids[ordinal]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def write_to_file(self, filename):
+        # 8 bytes SHA docID per ordinal
+        np.array(self.doc_ids, dtype='<u8').tofile(filename)
+
+    def read_from_file(self, filename):
+        self.doc_ids = np.fromfile(filename, dtype='<u8').tolist()
+        self.id_to_ordinal = {docID: ordinal for ordinal, docID in enumerate(self.doc_ids)}
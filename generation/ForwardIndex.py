@@ -1,15 +1,83 @@
 import struct
 import os
+import mmap
+from multiprocessing import Pool
+import numpy as np
+
+# Word entry of a forward index document: 4 bytes wordID, 1 byte context flags, 2 bytes frequency (packed)
+WORD_ENTRY_DTYPE = np.dtype([('wordID', '<u4'), ('flags', 'u1'), ('frequency', '<u2')])
+
+
+def read_documents(filename):
+    """
+    Stream the documents of a forward index file as (document ordinal, word entries, max frequency)
+    without loading the file. Word entries are WORD_ENTRY_DTYPE arrays over the memory-mapped file.
+    """
+    if os.path.getsize(filename) == 0:
+        return
+    with open(filename, 'rb') as file:
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    offset = 0
+    while offset < len(data):
+        docID, word_count = struct.unpack_from("<IH", data, offset)
+        offset += 6
+        word_data = np.frombuffer(data, dtype=WORD_ENTRY_DTYPE, count=word_count, offset=offset)
+        offset += word_count * WORD_ENTRY_DTYPE.itemsize
+        max_frequency = struct.unpack_from("<H", data, offset)[0]
+        offset += 2
+        yield docID, word_data, max_frequency
+
+
+def pack_document(docID, word_data, max_frequency):
+    """
+    Serialize a document: 4 bytes document ordinal, 2 bytes number of word entries, the word entries
+    (see WORD_ENTRY_DTYPE) packed in bulk and 2 bytes max frequency.
+    Entries can be tuples or [wordID, context_flags, frequency] lists as built by ingestion.py.
+    """
+    # A structured array takes every entry as one record only when it is a tuple
+    entries = np.array([tuple(entry) for entry in word_data], dtype=WORD_ENTRY_DTYPE)
+    return struct.pack("<IH", docID, len(word_data)) + entries.tobytes() + struct.pack("<H", max_frequency)
+
+
+def write_bucket(filename, documents):
+    """
+    Write (document ordinal, word data, max frequency) tuples to a bucket file in one write.
+    Runs in a worker process. Returns the document ordinals and their offsets in the bucket.
+    """
+    entries = [pack_document(*document) for document in documents]
+    offsets = np.zeros(len(entries), dtype='<u4')
+    offsets[1:] = np.cumsum([len(entry) for entry in entries[:-1]])
+    with open(filename, 'wb') as file:
+        file.write(b''.join(entries))
+    return [docID for docID, _, _ in documents], offsets
+
+
+def read_columns(filename):
+    """
+    Load a forward index file into columnar arrays: the document ordinal of every word entry,
+    the word entries (see WORD_ENTRY_DTYPE) and a dictionary of document ordinal -> max frequency.
+    """
+    docIDs, word_counts, entries, doc_max_freq = [], [], [], {}
+    for docID, word_data, max_frequency in read_documents(filename):
+        docIDs.append(docID)
+        word_counts.append(len(word_data))
+        entries.append(word_data)
+        doc_max_freq[docID] = max_frequency
+
+    docs = np.repeat(np.array(docIDs, dtype=np.uint32), word_counts)
+    word_entries = np.concatenate(entries) if entries else np.empty(0, dtype=WORD_ENTRY_DTYPE)
+    return docs, word_entries, doc_max_freq
 
 
 class ForwardIndex:
     def __init__(self):
-        self.doc_to_wordIDs = {}  # Dictionary to store docID -> list of word data
+        self.doc_to_wordIDs = {}  # Dictionary to store document ordinal -> list of word data
 
     def add_document(self, docID, word_data, max_frequency):
         """
         Add a document to the forward index.
-        :param docID: Unique 8-byte integer identifier for the document.
+        :param docID: Dense 4-byte document ordinal (see DocumentTable).
         :param word_data: List of tuples (wordID, context_flags, frequency).
         :param max_frequency: Maximum frequency of any word in the document.
         """
@@ -24,96 +92,51 @@ class ForwardIndex:
     def write_to_file(self, filename):
         with open(filename, 'wb') as file:
             for docID, (word_data, max_frequency) in self.doc_to_wordIDs.items():
-                # Pack docID (8 bytes) and number of word entries (2 bytes)
-                header = struct.pack("<QH", docID, len(word_data))
-
-                # Pack word data (4-byte wordID, 1-byte context_flags, 2-byte frequency each)
-                word_entries = b''.join(struct.pack("<IBH", wordID, context_flags, frequency)
-                                        for wordID, context_flags, frequency in word_data)
-
-                # Pack max_frequency (2 bytes)
-                max_freq_data = struct.pack("<H", max_frequency)
-
-                # Write all data to file
-                file.write(header + word_entries + max_freq_data)
+                file.write(pack_document(docID, word_data, max_frequency))
 
     def read_from_file(self, filename):
-        with open(filename, 'rb') as file:
-            while True:
-                # Read the header (docID and word count)
-                header = file.read(10)  # 8 bytes docID + 2 bytes word count
-                if not header:
-                    break
-                docID, word_count = struct.unpack("<QH", header)
-
-                # Read all word data
-                word_data = []
-                for _ in range(word_count):
-                    word_entry = file.read(7)  # 4 bytes wordID, 1 byte context_flags, 2 bytes frequency
-                    wordID, context_flags, frequency = struct.unpack("<IBH", word_entry)
-                    word_data.append((wordID, context_flags, frequency))
-
-                # Read max_frequency (2 bytes)
-                max_frequency = struct.unpack("<H", file.read(2))[0]
-
-                # Add to index
-                self.doc_to_wordIDs[docID] = (word_data, max_frequency)
+        for docID, word_data, max_frequency in read_documents(filename):
+            # Word entries come out as (wordID, context_flags, frequency) tuples
+            self.doc_to_wordIDs[docID] = (word_data.tolist(), max_frequency)
 
 
 class BarrelsManager:
     def __init__(self, num_barrels=38, output_directory="barrels/forward_index"):
         self.num_barrels = num_barrels
         self.output_directory = output_directory
-        self.offsets = {}  # Tracks docID -> offset
+        self.offsets = {}  # Tracks document ordinal -> offset
 
-    def make_barrels(self, index):
+    def make_barrels(self, index, workers=None):
+        """Write the documents of a ForwardIndex to the buckets, over workers processes (all cores by default)."""
         os.makedirs(self.output_directory, exist_ok=True)  # Ensure output directory exists
-        buckets = [{} for _ in range(self.num_barrels)]
-        self.offsets = {}  # Initialize metadata for all documents
+        buckets = [[] for _ in range(self.num_barrels)]
 
         # Divide documents into buckets
         for docID, (word_data, max_frequency) in index.get_index().items():
             bucket_index = docID % self.num_barrels  # Assign docID to a bucket
-            buckets[bucket_index][docID] = (word_data, max_frequency)
+            buckets[bucket_index].append((docID, word_data, max_frequency))
 
         # Write buckets to files and track offsets
-        for i, bucket in enumerate(buckets):
-            bucket_file = f"{self.output_directory}/bucket_{i}.bin"
+        tasks = [(f"{self.output_directory}/bucket_{i}.bin", bucket) for i, bucket in enumerate(buckets)]
+        if workers == 1:
+            results = [write_bucket(*task) for task in tasks]
+        else:
+            with Pool(processes=workers) as pool:
+                results = pool.starmap(write_bucket, tasks)
 
-            with open(bucket_file, 'wb') as file:
-                offset = 0
-                for docID, (word_data, max_frequency) in bucket.items():
-                    # Serialize data
-                    header = struct.pack("<QH", docID, len(word_data))
-                    word_entries = b''.join(struct.pack("<IBH", wordID, context_flags, frequency)
-                                            for wordID, context_flags, frequency in word_data)
-                    max_freq_data = struct.pack("<H", max_frequency)
-
-                    # Write to file
-                    file.write(header + word_entries + max_freq_data)
-
-                    # Record offset in metadata
-                    self.offsets[docID] = offset  # Store only the offset
-
-                    # Update offset
-                    offset += len(header) + len(word_entries) + len(max_freq_data)
+        self.offsets = {}
+        for docIDs, offsets in results:
+            self.offsets.update(zip(docIDs, offsets.tolist()))
 
-        # Write all offsets to a single metadata file
+        # Write all offsets to a single metadata file, as a flat array indexed by document ordinal
         metadata_file = f"{self.output_directory}/offsets.bin"
-        with open(metadata_file, 'wb') as meta_file:
-            for docID, offset in self.offsets.items():
-                # Pack docID (8 bytes) and offset (4 bytes)
-                meta_file.write(struct.pack("<QI", docID, offset))
+        offsets = np.zeros(max(self.offsets, default=-1) + 1, dtype='<u4')
+        offsets[list(self.offsets.keys())] = list(self.offsets.values())
+        offsets.tofile(metadata_file)
 
     def load_metadata(self, metadata_file):
-        self.offsets = {}
-        with open(metadata_file, 'rb') as meta_file:
-            while True:
-                meta_data = meta_file.read(12)  # 8 bytes docID + 4 bytes offset
-                if not meta_data:
-                    break
-                docID, offset = struct.unpack("<QI", meta_data)
-                self.offsets[docID] = offset
+        # 4 bytes offset per document ordinal
+        self.offsets = dict(enumerate(np.fromfile(metadata_file, dtype='<u4').tolist()))
 
     def get_document(self, docID):
         if docID not in self.offsets:
@@ -126,8 +149,8 @@ class BarrelsManager:
         # Read the document data
         with open(bucket_file, 'rb') as file:
             file.seek(self.offsets[docID])
-            header = file.read(10)  # 8 bytes docID + 2 bytes word_count
-            _, word_count = struct.unpack("<QH", header)
+            header = file.read(6)  # 4 bytes document ordinal + 2 bytes word_count
+            _, word_count = struct.unpack("<IH", header)
 
             word_data = [struct.unpack("<IBH", file.read(7)) for _ in range(word_count)]
             max_frequency = struct.unpack("<H", file.read(2))[0]
@@ -1,17 +1,127 @@
 import struct
 import os
+from multiprocessing import Pool
+import numpy as np
+from ForwardIndex import WORD_ENTRY_DTYPE
+
+# Number of postings in a compressed barrel block, covered by one skip pointer and block-max score
+BLOCK_SIZE = 128
+
+# Block table entry of an entry of more than one block: last document ordinal of the block,
+# byte offset of the block and highest impact of the block
+BLOCK_DTYPE = np.dtype([('last_doc', '<u4'), ('offset', '<u4'), ('max_impact', 'u1')])
+
+# Header bit-packed at the start of every block: bit widths of the document gaps (6 bits), context flags (3 bits),
+# frequencies (5 bits) and impacts (4 bits), then the lowest impact of the block (8 bits)
+BLOCK_HEADER_BITS = 26
+
+# Uncompressed posting of the inverted index file: 4 bytes document ordinal, 1 byte context flags, 2 bytes frequency
+POSTING_ENTRY_DTYPE = np.dtype([('doc', '<u4'), ('flags', 'u1'), ('frequency', '<u2')])
+
+# Offsets metadata entry: wordID and offset of its entry in its barrel
+OFFSET_DTYPE = np.dtype([('wordID', '<u4'), ('offset', '<u4')])
+
+
+def context_weight(context_flags):
+    """Weight of a posting based on where the word occurs in the document (same as the backend)."""
+    if context_flags & 0b0001:  # Title
+        return 3
+    elif context_flags & 0b0010:  # Text
+        return 1
+    elif context_flags & 0b0100:  # Tags
+        return 2
+    elif context_flags & 0b1000:  # Authors
+        return 2
+    return 1
+
+
+# Weight of every combination of context flags
+CONTEXT_WEIGHTS = np.array([context_weight(flags) for flags in range(256)])
+
+# Impacts quantize (frequency / max_frequency) * context_weight on a log scale of IMPACT_LEVELS levels,
+# from MIN_PARTIAL_SCORE to the highest context weight (same as the backend, see scoring.py)
+IMPACT_LEVELS = 255
+MIN_PARTIAL_SCORE = 1 / 65535
+IMPACT_RATIO = (CONTEXT_WEIGHTS.max() / MIN_PARTIAL_SCORE) ** (1 / (IMPACT_LEVELS - 1))
+
+
+def impact_array(frequencies, flags, max_frequencies):
+    """Quantized 1-byte impact of every posting (1 to IMPACT_LEVELS), given the max frequency of its document."""
+    partial_scores = frequencies / np.maximum(max_frequencies, 1) * CONTEXT_WEIGHTS[flags]
+    levels = np.rint(np.log(partial_scores / MIN_PARTIAL_SCORE) / np.log(IMPACT_RATIO)) + 1
+    return np.clip(levels, 1, IMPACT_LEVELS).astype(np.uint8)
+
+
+def encode_varint(value):
+    """LEB128 encoding of an unsigned integer: 7 bits per byte, the high bit set on all but the last byte."""
+    data = bytearray()
+    while value >= 0x80:
+        data.append(value & 0x7F | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def bit_width(values):
+    """Number of bits needed by the largest value."""
+    return int(values.max()).bit_length() if len(values) else 0
+
+
+def pack_fields(fields):
+    """
+    Bit-pack (values, width) pairs one after the other into a single stream padded to a whole byte,
+    least significant bit first. Values of width 0 take no space.
+    """
+    bits = [((np.asarray(values, dtype=np.uint64)[:, None] >> np.arange(width, dtype=np.uint64)) & 1).ravel()
+            for values, width in fields if width]
+    if not bits:
+        return b''
+    return np.packbits(np.concatenate(bits).astype(np.uint8), bitorder='little').tobytes()
+
+
+def encode_arrays(wordID, docs, flags, frequencies, impacts):
+    """
+    Serialize the barrel entry of wordID from postings given as arrays sorted by document ordinal (same format
+    as the backend's inverted_index.encode_entry): a header (wordID, doc count and length of the block data, as
+    varints), the block table unless the postings fit in a single block, and the blocks. Every block is one bit
+    stream padded to a whole byte: the block header (see BLOCK_HEADER_BITS), then the document gaps, context
+    flags, frequencies and impacts minus the lowest impact of the block, each at the smallest width that fits.
+    """
+    docs = np.asarray(docs, dtype=np.int64)
+    table = np.zeros(-(-len(docs) // BLOCK_SIZE), dtype=BLOCK_DTYPE)
+    data = bytearray()
+
+    previous = -1
+    for block, start in enumerate(range(0, len(docs), BLOCK_SIZE)):
+        end = min(start + BLOCK_SIZE, len(docs))
+        gaps = np.diff(docs[start:end], prepend=previous) - 1  # First gap is taken from the previous block
+        block_flags = flags[start:end] & 0xF
+        block_impacts = impacts[start:end].astype(np.int64)
+        min_impact = int(block_impacts.min())
+        doc_width, flag_width = bit_width(gaps), bit_width(block_flags)
+        frequency_width, impact_width = bit_width(frequencies[start:end]), bit_width(block_impacts - min_impact)
+        header = doc_width | flag_width << 6 | frequency_width << 9 | impact_width << 14 | min_impact << 18
+
+        table[block] = (docs[end - 1], len(data), block_impacts.max())
+        data += pack_fields([([header], BLOCK_HEADER_BITS), (gaps, doc_width), (block_flags, flag_width),
+                             (frequencies[start:end], frequency_width), (block_impacts - min_impact, impact_width)])
+        previous = docs[end - 1]
+
+    header = encode_varint(wordID) + encode_varint(len(docs)) + encode_varint(len(data))
+    return header + (table.tobytes() if len(table) > 1 else b'') + bytes(data)
 
 
 class InvertedIndex:
     def __init__(self):
-        # Dictionary to store wordID -> list of tuples (docID, context_flags, frequency)
+        # Dictionary to store wordID -> list of tuples (document ordinal, context_flags, frequency)
         self.word_to_docIDs = {}
-        # Dictionary to store docID -> max frequency
+        # Dictionary to store document ordinal -> max frequency
         self.doc_max_frequencies = {}
 
     def build_from_forward_index(self, forward_index):
         docNo = 1
-        for docID, (word_data, max_frequency) in forward_index.items():
+        # Visit documents in ordinal order so every postings list comes out sorted
+        for docID, (word_data, max_frequency) in sorted(forward_index.items()):
             self.doc_max_frequencies[docID] = max_frequency  # Store the max frequency for the document
             for wordID, context_flags, frequency in word_data:
                 if wordID not in self.word_to_docIDs:
@@ -35,9 +145,9 @@ class InvertedIndex:
                 # Pack the wordID (4 bytes) and number of docIDs (4 bytes)
                 header = struct.pack("<II", wordID, len(doc_data))
 
-                # Pack all docID data (8 bytes docID, 1 byte context_flags, 2 bytes frequency)
+                # Pack all document data (4 bytes ordinal, 1 byte context_flags, 2 bytes frequency)
                 doc_entries = b''.join(
-                    struct.pack("<QBH", docID, context_flags, frequency)
+                    struct.pack("<IBH", docID, context_flags, frequency)
                     for docID, context_flags, frequency in doc_data
                 )
 
@@ -45,10 +155,7 @@ class InvertedIndex:
                 file.write(header + doc_entries)
 
         # Write the max frequencies to a separate file
-        with open(max_freq_filename, 'wb') as max_file:
-            for docID, max_frequency in self.doc_max_frequencies.items():
-                # Pack docID (8 bytes) and max frequency (2 bytes)
-                max_file.write(struct.pack("<QH", docID, max_frequency))
+        write_max_frequencies(max_freq_filename, self.doc_max_frequencies)
 
     def read_from_file(self, index_filename, max_freq_filename):
         # Read the inverted index from a file
@@ -62,88 +169,112 @@ class InvertedIndex:
                 # Unpack wordID (4 bytes) and doc count (4 bytes)
                 wordID, doc_count = struct.unpack("<II", header_data)
 
-                # Read the next `doc_count * 11` bytes (docID, context_flags, frequency)
-                doc_entries = file.read(doc_count * 11)
-                doc_data = [
-                    struct.unpack("<QBH", doc_entries[i:i + 11])
-                    for i in range(0, len(doc_entries), 11)
-                ]
+                # Read the next `doc_count * 7` bytes (document ordinal, context_flags, frequency)
+                doc_entries = file.read(doc_count * 7)
+                doc_data = np.frombuffer(doc_entries, dtype=POSTING_ENTRY_DTYPE).tolist()
 
                 # Update the inverted index
                 self.word_to_docIDs[wordID] = doc_data
 
         # Read the max frequencies from a separate file
-        self.doc_max_frequencies = {}
         with open(max_freq_filename, 'rb') as max_file:
-            while True:
-                max_data = max_file.read(10)  # 8 bytes docID, 2 bytes max frequency
-                if not max_data:
-                    break
-                docID, max_frequency = struct.unpack("<QH", max_data)
-                self.doc_max_frequencies[docID] = max_frequency
+            max_file.read(4)  # Skip the document count
+            max_frequencies = np.frombuffer(max_file.read(), dtype='<u2')
+        self.doc_max_frequencies = dict(enumerate(max_frequencies.tolist()))
 
 
 class BarrelsManager:
     def __init__(self, num_barrels=60, output_dir="barrels/inverted_index"):
         self.num_barrels = num_barrels  # Number of barrels
         self.output_dir = output_dir  # Directory to store barrels
-        self.offsets = {}  # Mapping of barrels to their wordID ranges or offsets
-
-    def make_barrels(self, index):
-        os.makedirs(self.output_dir, exist_ok=True)  # Ensure the output directory exists
-
-        # Initialize barrels (as dictionaries for now)
-        barrels = [{} for _ in range(self.num_barrels)]
-        self.offsets = {i: {} for i in range(self.num_barrels)}  # Initialize metadata
-        doc_max_freq = {}
-
-        # Assign wordIDs to barrels and track max frequencies per docID
-        for wordID, doc_data in index.get_index().items():
-            barrel_index = wordID % self.num_barrels  # Example: hash-based assignment
-            barrels[barrel_index][wordID] = doc_data
-            for docID, _, frequency in doc_data:
-                doc_max_freq[docID] = max(doc_max_freq.get(docID, 0), frequency)
-
-        # Write each barrel to a file and store offsets
-        for i, barrel in enumerate(barrels):
-            barrel_filename = f"{self.output_dir}/barrel_{i}.bin"
-            self.offsets[i] = {}
-
-            with open(barrel_filename, 'wb') as file:
-                offset = 0
-                for wordID, doc_data in barrel.items():
-                    # Serialize and write wordID and its doc data
-                    header = struct.pack("<II", wordID, len(doc_data))  # 4 bytes wordID, 4 bytes doc count
-                    doc_entries = b''.join(
-                        struct.pack("<QBH", docID, context_flags, frequency)
-                        for docID, context_flags, frequency in doc_data
-                    )
-                    file.write(header + doc_entries)
-
-                    self.offsets[i][wordID] = offset
-
-                    offset += len(header) + len(doc_entries)
-
-        # Write offsets to a metadata file
-        metadata_file = f"{self.output_dir}/offsets.bin"
-        with open(metadata_file, 'wb') as meta_file:
-            for barrel_index, offsets in self.offsets.items():
-                for wordID, word_offset in offsets.items():
-                    # Serialize wordID (4 bytes) and offset (4 bytes)
-                    meta_file.write(struct.pack("<II", wordID, word_offset))  # wordID and 4-byte offset
-
-        # Write max frequencies to a separate file
+
+    def make_barrels(self, index, workers=None):
+        """Write the barrels of an InvertedIndex, in parallel over workers processes (all cores by default)."""
+        word_to_docIDs = index.get_index()
+        postings = np.array([posting for doc_data in word_to_docIDs.values() for posting in doc_data],
+                            dtype=POSTING_ENTRY_DTYPE)
+        wordIDs = np.repeat(np.fromiter(word_to_docIDs.keys(), dtype=np.uint32, count=len(word_to_docIDs)),
+                            [len(doc_data) for doc_data in word_to_docIDs.values()])
+
+        # Max frequency of every document, taken from its postings
+        max_frequencies = np.zeros(int(postings['doc'].max()) + 1 if len(postings) else 0, dtype=np.uint16)
+        np.maximum.at(max_frequencies, postings['doc'], postings['frequency'])
+        docs = np.flatnonzero(max_frequencies)
+        doc_max_freq = dict(zip(docs.tolist(), max_frequencies[docs].tolist()))
+
+        word_entries = np.zeros(len(postings), dtype=WORD_ENTRY_DTYPE)
+        word_entries['wordID'] = wordIDs
+        word_entries['flags'] = postings['flags']
+        word_entries['frequency'] = postings['frequency']
+        self.make_barrels_from_columns(postings['doc'], word_entries, doc_max_freq, workers)
+
+    def make_barrels_from_columns(self, docs, word_entries, doc_max_freq, workers=None):
+        """
+        Write the barrels of a forward index loaded with ForwardIndex.read_columns, inverting it in memory
+        with one sort: the postings are ordered by barrel, wordID and document ordinal, so every barrel is
+        a contiguous slice. Impacts are computed for all postings at once, then the barrels are encoded and
+        written in parallel over workers processes (all cores by default).
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        max_frequencies = np.ones(max(doc_max_freq, default=-1) + 1, dtype=np.uint16)
+        max_frequencies[list(doc_max_freq.keys())] = list(doc_max_freq.values())
+
+        wordIDs = word_entries['wordID']
+        order = np.lexsort((docs, wordIDs, wordIDs % self.num_barrels))
+        docs, wordIDs = docs[order], wordIDs[order]
+        flags, frequencies = word_entries['flags'][order], word_entries['frequency'][order]
+        impacts = impact_array(frequencies, flags, max_frequencies[docs])
+
+        barrel_starts = np.searchsorted(wordIDs % self.num_barrels, np.arange(self.num_barrels + 1))
+        tasks = [(f"{self.output_dir}/barrel_{i}.bin",) +
+                 tuple(column[barrel_starts[i]:barrel_starts[i + 1]]
+                       for column in (wordIDs, docs, flags, frequencies, impacts))
+                 for i in range(self.num_barrels)]
+        if workers == 1:
+            offsets = [write_barrel(*task) for task in tasks]
+        else:
+            with Pool(processes=workers) as pool:
+                offsets = pool.starmap(write_barrel, tasks)
+
+        np.concatenate(offsets).tofile(f"{self.output_dir}/offsets.bin")
         self.write_max_frequencies(doc_max_freq)
 
     def write_max_frequencies(self, doc_max_freq):
-        max_frequencies_file = f"{self.output_dir}/max_frequencies.bin"
-        unique_doc_count = len(doc_max_freq)  # Calculate the total number of unique docIDs
+        write_max_frequencies(f"{self.output_dir}/max_frequencies.bin", doc_max_freq)
+
+
+def write_barrel(filename, wordIDs, docs, flags, frequencies, impacts):
+    """
+    Encode the postings of one barrel, sorted by wordID and document ordinal, and write them to filename
+    in one write. Runs in a worker process. Returns the offsets metadata of the barrel (see OFFSET_DTYPE).
+    """
+    word_starts = np.flatnonzero(np.diff(wordIDs.astype(np.int64), prepend=-1))
+    word_ends = np.append(word_starts[1:], len(wordIDs))
+    offsets = np.zeros(len(word_starts), dtype=OFFSET_DTYPE)
+    offsets['wordID'] = wordIDs[word_starts]
+
+    entries = []
+    offset = 0
+    for word, (start, end) in enumerate(zip(word_starts.tolist(), word_ends.tolist())):
+        entry = encode_arrays(int(wordIDs[start]), docs[start:end], flags[start:end],
+                              frequencies[start:end], impacts[start:end])
+        entries.append(entry)
+        offsets['offset'][word] = offset
+        offset += len(entry)
+
+    with open(filename, 'wb') as file:
+        file.write(b''.join(entries))
+    return offsets
+
 
-        with open(max_frequencies_file, 'wb') as file:
-            # Write the total number of unique docIDs (4 bytes)
-            file.write(struct.pack("<I", unique_doc_count))
+def write_max_frequencies(filename, doc_max_freq):
+    """
+    Write the total number of documents (4 bytes) followed by the
+    max frequency (2 bytes) of every document, indexed by document ordinal.
+    """
+    max_frequencies = np.ones(max(doc_max_freq, default=-1) + 1, dtype='<u2')
+    max_frequencies[list(doc_max_freq.keys())] = list(doc_max_freq.values())
 
-            # Write each docID and its max frequency
-            for docID, max_freq in doc_max_freq.items():
-                # 8 bytes for docID, 2 bytes for max frequency
-                file.write(struct.pack("<QH", docID, max_freq))
+    with open(filename, 'wb') as file:
+        file.write(struct.pack("<I", len(doc_max_freq)))
+        file.write(max_frequencies.tobytes())
@@ -0,0 +1,103 @@
+import os
+import heapq
+import itertools
+from contextlib import ExitStack
+import numpy as np
+from ForwardIndex import read_documents
+from InvertedIndex import OFFSET_DTYPE, encode_arrays, impact_array, write_max_frequencies
+
+# Posting of a sorted run: wordID, document ordinal, context flags and frequency (packed)
+RUN_DTYPE = np.dtype([('wordID', '<u4'), ('doc', '<u4'), ('flags', 'u1'), ('frequency', '<u2')])
+
+# Bytes of postings buffered before they are sorted into a run (sorting needs about as much again)
+MEMORY_BUDGET = 256 * 1024 * 1024
+
+
+class SpimiBuilder:
+    """
+    Builds the inverted index barrels from a forward index file without holding the whole index in memory
+    (single-pass in-memory indexing). Documents are streamed from the file and their postings buffered until
+    they fill the memory budget; the buffer is then sorted by wordID and written to a run file. Once every
+    document is read, the runs are merged word by word straight into the barrel files.
+    """
+
+    def __init__(self, num_barrels=60, output_dir="barrels/inverted_index", memory_budget=MEMORY_BUDGET):
+        self.num_barrels = num_barrels
+        self.output_dir = output_dir
+        self.run_dir = os.path.join(output_dir, "runs")
+        self.max_postings = max(memory_budget // RUN_DTYPE.itemsize, 1)
+        self.runs = []  # (run filename, wordIDs of the run, start of every wordID in the run and the run length)
+        self.doc_max_freq = {}  # Document ordinal -> max frequency
+
+    def build(self, forward_index_file):
+        """Write the barrels, the offsets metadata and the max frequencies of a forward index file."""
+        os.makedirs(self.run_dir, exist_ok=True)
+
+        buffer = []
+        buffered = 0
+        for docID, word_data, max_frequency in read_documents(forward_index_file):
+            self.doc_max_freq[docID] = max_frequency
+
+            postings = np.empty(len(word_data), dtype=RUN_DTYPE)
+            postings['wordID'] = word_data['wordID']
+            postings['doc'] = docID
+            postings['flags'] = word_data['flags']
+            postings['frequency'] = word_data['frequency']
+            buffer.append(postings)
+            buffered += len(postings)
+
+            if buffered >= self.max_postings:
+                self.write_run(np.concatenate(buffer))
+                buffer = []
+                buffered = 0
+                print(f"Wrote run {len(self.runs)}")
+        if buffered:
+            self.write_run(np.concatenate(buffer))
+
+        self.merge_runs()
+        write_max_frequencies(f"{self.output_dir}/max_frequencies.bin", self.doc_max_freq)
+
+    def write_run(self, postings):
+        """Sort postings by wordID and document ordinal and write them to a new run file."""
+        postings = postings[np.lexsort((postings['doc'], postings['wordID']))]
+        wordIDs, starts = np.unique(postings['wordID'], return_index=True)
+
+        run_filename = os.path.join(self.run_dir, f"run_{len(self.runs)}.bin")
+        postings.tofile(run_filename)
+        self.runs.append((run_filename, wordIDs, np.append(starts, len(postings))))
+
+    def merge_runs(self):
+        """Merge the runs into the barrel files, visiting the words in wordID order, then delete the runs."""
+        runs = [np.memmap(run_filename, dtype=RUN_DTYPE, mode='r') for run_filename, _, _ in self.runs]
+        max_frequencies = np.ones(max(self.doc_max_freq, default=-1) + 1, dtype=np.uint16)
+        max_frequencies[list(self.doc_max_freq.keys())] = list(self.doc_max_freq.values())
+
+        # (wordID, run, start, end) of the postings of every word in every run, in wordID order
+        slices = heapq.merge(*(zip(wordIDs.tolist(), itertools.repeat(run), starts[:-1].tolist(), starts[1:].tolist())
+                               for run, (_, wordIDs, starts) in enumerate(self.runs)))
+
+        offsets = []
+        barrel_sizes = [0] * self.num_barrels
+        with ExitStack() as stack:
+            barrels = [stack.enter_context(open(f"{self.output_dir}/barrel_{i}.bin", 'wb'))
+                       for i in range(self.num_barrels)]
+
+            for wordID, word_slices in itertools.groupby(slices, key=lambda word_slice: word_slice[0]):
+                postings = np.concatenate([runs[run][start:end] for _, run, start, end in word_slices])
+                postings = postings[np.argsort(postings['doc'], kind='stable')]
+
+                impacts = impact_array(postings['frequency'], postings['flags'], max_frequencies[postings['doc']])
+                entry = encode_arrays(wordID, postings['doc'], postings['flags'], postings['frequency'], impacts)
+
+                barrel_index = wordID % self.num_barrels
+                barrels[barrel_index].write(entry)
+                offsets.append((wordID, barrel_sizes[barrel_index]))
+                barrel_sizes[barrel_index] += len(entry)
+
+        np.array(offsets, dtype=OFFSET_DTYPE).tofile(f"{self.output_dir}/offsets.bin")
+
+        del runs  # Unmap the runs before deleting them
+        for run_filename, _, _ in self.runs:
+            os.remove(run_filename)
+        os.rmdir(self.run_dir)
+        self.runs = []
@@ -1,8 +1,10 @@
 from ForwardIndex import ForwardIndex, BarrelsManager
 
-fi = ForwardIndex()
-fi.read_from_file('files/forward_index.bin')
+# The buckets are written by a process pool, which re-imports this module on platforms that spawn processes
+if __name__ == '__main__':
+    fi = ForwardIndex()
+    fi.read_from_file('files/forward_index.bin')
 
-bm = BarrelsManager()
+    bm = BarrelsManager()
 
-bm.make_barrels(fi)
+    bm.make_barrels(fi)
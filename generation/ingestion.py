@@ -0,0 +1,188 @@
+import os
+import json
+import pandas as pd
+from collections import Counter, deque
+from multiprocessing import Pool
+from hashlib import sha256
+from tokenize_text import nlp, normalize_tokens, lemmatize, surface_lemmas
+from Lexicon import Lexicon
+from lemma_dictionary import LemmaDictionary
+from ForwardIndex import ForwardIndex
+from DocumentTable import DocumentTable, sanitize_value
+
+# Number of rows read from the dataset at a time, each chunk is one task of the pool
+CHUNK_SIZE = 1000
+
+# Number of worker processes tokenizing chunks
+WORKERS = os.cpu_count() or 1
+
+# Chunks handed to the pool ahead of the one being merged, which bounds the memory held by pending chunks
+MAX_IN_FLIGHT = 2 * WORKERS
+
+# Number of texts spaCy lemmatizes together in a worker
+PIPE_BATCH_SIZE = 64
+
+# Dataset columns of the tokenized fields and their context flags, in the order their words enter the lexicon
+COLUMN_FLAGS = (
+    (0, 1),  # Title: bit 0
+    (1, 2),  # Text: bit 1
+    (3, 8),  # Authors: bit 3
+    (5, 4),  # Tags: bit 2
+)
+URL_COLUMN = 2
+
+# Directory of the per-chunk checkpoints: the analysis of every chunk, reused by later runs while the chunk is unchanged
+CHECKPOINT_DIR = 'files/ingestion'
+
+# Bumped whenever analyze_chunk changes its output, so checkpoints of earlier versions are analyzed again
+CHECKPOINT_VERSION = 2
+
+
+def sha_256(data):
+    hash_value = sha256(data).digest()
+    return int.from_bytes(hash_value[:8], byteorder='big')  # Use 'little' if needed
+
+
+def analyze_chunk(rows):
+    """
+    Tokenize the fields of a chunk of rows in one nlp.pipe pass. Runs in a worker process.
+    Returns the URL and the tokens of every field of each row, and the (surface form, lemma) counts of the chunk.
+    """
+    texts = (' '.join(normalize_tokens(row[column])) for row in rows for column, _ in COLUMN_FLAGS)
+    tokens = []
+    lemma_counts = Counter()
+    for doc in nlp.pipe(texts, batch_size=PIPE_BATCH_SIZE):
+        tokens.append(lemmatize(doc))
+        lemma_counts.update(surface_lemmas(doc))
+
+    fields = len(COLUMN_FLAGS)
+    analyzed_rows = [(sanitize_value(row[URL_COLUMN]), tokens[i * fields:(i + 1) * fields])
+                     for i, row in enumerate(rows)]
+    return analyzed_rows, lemma_counts
+
+
+def chunk_fingerprint(rows):
+    """SHA-256 of the rows of a chunk and CHECKPOINT_VERSION, which tells whether a checkpoint still matches."""
+    digest = sha256(str(CHECKPOINT_VERSION).encode('utf-8'))
+    for row in rows:
+        digest.update(repr(row).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def checkpoint_path(number):
+    return os.path.join(CHECKPOINT_DIR, f"chunk_{number}.json")
+
+
+def load_checkpoint(number, fingerprint):
+    """Return the analysis saved for a chunk, or None if there is none or the chunk has changed."""
+    try:
+        with open(checkpoint_path(number), 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if checkpoint['fingerprint'] != fingerprint:
+        return None
+    return checkpoint['rows'], Counter({(surface, lemma): count for surface, lemma, count in checkpoint['lemmas']})
+
+
+def analyze_and_checkpoint(number, fingerprint, rows):
+    """analyze_chunk, then save the analysis as the checkpoint of the chunk. Runs in a worker process."""
+    analyzed_rows, lemma_counts = analyze_chunk(rows)
+    checkpoint = {
+        "fingerprint": fingerprint,
+        "rows": analyzed_rows,
+        "lemmas": [[surface, lemma, count] for (surface, lemma), count in lemma_counts.items()],
+    }
+
+    # Written to a temporary file first so a crash never leaves a partial checkpoint
+    path = checkpoint_path(number)
+    with open(path + '.tmp', 'w', encoding='utf-8') as file:
+        json.dump(checkpoint, file)
+    os.replace(path + '.tmp', path)
+    return analyzed_rows, lemma_counts
+
+
+def analyzed_chunks(pool, chunks):
+    """
+    Analyze chunks in the pool, yielding the results in dataset order so the merge is deterministic.
+    Chunks with a matching checkpoint are read back instead of being analyzed again.
+    """
+    def ready(result):
+        return result if isinstance(result, tuple) else result.get()
+
+    pending = deque()
+    for number, chunk in enumerate(chunks):
+        rows = list(chunk.itertuples(index=False, name=None))
+        fingerprint = chunk_fingerprint(rows)
+        result = load_checkpoint(number, fingerprint)
+        if result is None:
+            result = pool.apply_async(analyze_and_checkpoint, (number, fingerprint, rows))
+        pending.append(result)
+
+        if len(pending) >= MAX_IN_FLIGHT:
+            yield ready(pending.popleft())
+    while pending:
+        yield ready(pending.popleft())
+
+
+def add_document(lexicon, fi, documents, url, field_tokens):
+    """Give a row a document ordinal and IDs for its words and add it to the forward index. False if skipped."""
+    sha_docID = sha_256(url.encode('utf-8'))
+    if documents.get_ordinal(sha_docID) is not None:
+        print("Duplicate docID")
+        return False
+    if not any(field_tokens):
+        return False  # Nothing to index
+
+    word_data = {}
+    for tokens, (_, context_flag) in zip(field_tokens, COLUMN_FLAGS):
+        for token in tokens:
+            lexicon.add_word(token)
+            wordID = lexicon.get_word_id(token)
+            if wordID in word_data:
+                word_data[wordID][1] |= context_flag  # Update context_flag (bitwise OR)
+                word_data[wordID][2] += 1  # Increment frequency
+            else:
+                word_data[wordID] = [wordID, context_flag, 1]  # New entry
+
+    doc_word_data = list(word_data.values())
+    max_frequency = max(freq for _, _, freq in doc_word_data)
+    fi.add_document(documents.add_document(sha_docID), doc_word_data, max_frequency)
+    return True
+
+
+def main():
+    lexicon = Lexicon()
+    fi = ForwardIndex()
+    documents = DocumentTable()
+
+    # Occurrences of every (surface form, lemma) pair, for the lemma dictionary used by queries
+    lemma_counts = Counter()
+
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    chunks = pd.read_csv('files/medium_articles.csv', chunksize=CHUNK_SIZE)
+    rowNo = 0
+    with Pool(processes=WORKERS) as pool:
+        # Chunks are merged in dataset order, so words and documents get the same IDs whatever the number of workers
+        for rows, chunk_lemma_counts in analyzed_chunks(pool, chunks):
+            for url, field_tokens in rows:
+                add_document(lexicon, fi, documents, url, field_tokens)
+            lemma_counts.update(chunk_lemma_counts)
+
+            # Keep track of execution progress
+            rowNo += len(rows)
+            print(f"Processed {rowNo} rows")
+
+    lexicon.write_to_file('files/lexicon.bin')
+    fi.write_to_file('files/forward_index.bin')
+    documents.write_to_file('files/documents.bin')
+
+    # Map every surface form to its most frequent lemma, spaCy's lemma depends on the context
+    lemmas = {}
+    for (surface, lemma), count in lemma_counts.most_common():
+        lemmas.setdefault(surface, lemma)
+    LemmaDictionary.write('files/lemmas.bin', lemmas.items())
+
+
+if __name__ == '__main__':
+    main()
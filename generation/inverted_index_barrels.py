@@ -1,8 +1,10 @@
 from InvertedIndex import InvertedIndex, BarrelsManager
 
-ii = InvertedIndex()
-ii.read_from_file('files/inverted_index.bin', 'files/max_frequencies.bin')
+# The barrels are written by a process pool, which re-imports this module on platforms that spawn processes
+if __name__ == '__main__':
+    ii = InvertedIndex()
+    ii.read_from_file('files/inverted_index.bin', 'files/max_frequencies.bin')
 
-bm = BarrelsManager()
+    bm = BarrelsManager()
 
-bm.make_barrels(ii)
+    bm.make_barrels(ii)
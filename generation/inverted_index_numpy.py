@@ -0,0 +1,10 @@
+from ForwardIndex import read_columns
+from InvertedIndex import BarrelsManager
+
+# Inverts the forward index in memory with NumPy and writes the barrels, in place of
+# inverted_index_generation.py followed by inverted_index_barrels.py when the index fits in memory
+if __name__ == '__main__':
+    docs, word_entries, doc_max_freq = read_columns('files/forward_index.bin')
+
+    bm = BarrelsManager()
+    bm.make_barrels_from_columns(docs, word_entries, doc_max_freq)
@@ -0,0 +1,7 @@
+from SpimiBuilder import SpimiBuilder
+
+# Writes the barrels straight from the forward index within a bounded amount of memory,
+# in place of inverted_index_generation.py followed by inverted_index_barrels.py
+if __name__ == '__main__':
+    builder = SpimiBuilder()
+    builder.build('files/forward_index.bin')
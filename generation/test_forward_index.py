@@ -0,0 +1,48 @@
+import os
+import struct
+import tempfile
+from ForwardIndex import ForwardIndex, BarrelsManager, read_documents
+
+# Round trip of the forward index through its files, with word entries shaped like the ones of ingestion.py:
+# [wordID, context_flags, frequency] lists, and values that do not fit in a byte
+documents = {
+    0: [[70000, 3, 1], [5, 0, 300]],
+    1: [[1, 1, 1]],
+    2: [[wordID, wordID % 256, wordID % 1000 + 1] for wordID in range(1000)],
+}
+
+index = ForwardIndex()
+for docID, word_data in documents.items():
+    index.add_document(docID, word_data, max(frequency for _, _, frequency in word_data))
+
+with tempfile.TemporaryDirectory() as directory:
+    filename = os.path.join(directory, 'forward_index.bin')
+    index.write_to_file(filename)
+
+    # A document takes 6 header bytes, 7 bytes per word entry and 2 bytes max frequency
+    expected_size = sum(6 + 7 * len(word_data) + 2 for word_data in documents.values())
+    assert os.path.getsize(filename) == expected_size
+
+    read_back = ForwardIndex()
+    read_back.read_from_file(filename)
+    for docID, word_data in documents.items():
+        entries, max_frequency = read_back.get_document(docID)
+        assert entries == [tuple(entry) for entry in word_data], docID
+        assert max_frequency == max(frequency for _, _, frequency in word_data)
+
+    for docID, word_data, _ in read_documents(filename):
+        assert word_data['wordID'].tolist() == [wordID for wordID, _, _ in documents[docID]]
+
+    # Same entries through the buckets of the forward index barrels
+    barrels = BarrelsManager(num_barrels=2, output_directory=os.path.join(directory, 'forward_index'))
+    barrels.make_barrels(index, workers=1)
+    for docID, word_data in documents.items():
+        entries, _ = barrels.get_document(docID)
+        assert entries == [tuple(entry) for entry in word_data], docID
+
+    # The first entry of document 0 starts right after its header
+    with open(filename, 'rb') as file:
+        file.seek(6)
+        assert struct.unpack("<IBH", file.read(7)) == (70000, 3, 1)
+
+print("Forward index round trip passed")
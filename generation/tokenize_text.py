@@ -5,8 +5,8 @@ import unicodedata
 import inflect
 
 
-# Load spaCy model for lemmatization
-nlp = spacy.load("en_core_web_sm")
+# Load spaCy model for lemmatization, without the parser and entity recognizer that lemmas do not need
+nlp = spacy.load("en_core_web_sm", disable=["parser", "ner"])
 
 # Initialize inflect engine for number-to-word conversion
 p = inflect.engine()
@@ -35,7 +35,8 @@ def remove_accents(input_str):
     return ''.join([c for c in nfkd_form if not unicodedata.combining(c)])
 
 
-def tokenize_text(text):
+def normalize_tokens(text):
+    """Split text into cleaned, lowercase ASCII tokens, ready to be lemmatized (steps 1 to 5)."""
     tokens = []
 
     # Ensure input is a string; convert non-string to empty string
@@ -71,11 +72,12 @@ def tokenize_text(text):
         cleaned_tokens.append(token)
 
     # Step 5: Remove non-ASCII characters and normalize accent characters
-    cleaned_tokens = [clean_text(remove_accents(token)) for token in cleaned_tokens if token]
+    return [clean_text(remove_accents(token)) for token in cleaned_tokens if token]
 
-    # Step 6: Lemmatize tokens using spaCy
+
+def lemmatize(doc):
+    """Lemmatized tokens of a spaCy doc, without stopwords (steps 6 and 7)."""
     lemmatized_tokens = []
-    doc = nlp(' '.join(cleaned_tokens))
     for token in doc:
         # Step 7: Remove stopwords
         if token.text not in custom_stopwords:
@@ -85,3 +87,25 @@ def tokenize_text(text):
             lemmatized_tokens.append(truncated_lemma)
 
     return lemmatized_tokens
+
+
+def tokenize_text(text):
+    # Step 6: Lemmatize tokens using spaCy
+    return lemmatize(nlp(' '.join(normalize_tokens(text))))
+
+
+def surface_lemmas(doc):
+    """
+    (surface form, lemma) pairs of the normalized tokens of a spaCy doc that spaCy kept whole, for the
+    lemma dictionary. The lemma of a stopword is empty. Tokens spaCy splits further are left out.
+    """
+    pairs = []
+    start = 0
+    for i, token in enumerate(doc):
+        # Normalized tokens are separated by spaces, so a token ends at whitespace or at the end of the doc
+        if token.whitespace_ or i == len(doc) - 1:
+            if i == start:
+                lemma = '' if token.text in custom_stopwords else token.lemma_[:30]
+                pairs.append((token.text, lemma))
+            start = i + 1
+    return pairs
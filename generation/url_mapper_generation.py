@@ -1,6 +1,7 @@
 import pandas as pd
+import numpy as np
 from hashlib import sha256
-import math
+from DocumentTable import DocumentTable, sanitize_value
 
 
 def sha_256(data):
@@ -13,16 +14,19 @@ def sha_256(data):
     return checksum
 
 
-def sanitize_value(value):
-    """Convert value to a string if not NaN, otherwise return an empty string."""
-    return str(value) if not (value is None or isinstance(value, float) and math.isnan(value)) else ""
-
-
 # Read dataset in chunks
 chunks = pd.read_csv('files/medium_articles.csv', chunksize=1000)
 
+# Document ordinals assigned by ingestion.py
+documents = DocumentTable()
+documents.read_from_file('files/documents.bin')
+
+# Offset of every document in url_mapper.bin, indexed by document ordinal
+offsets = np.zeros(len(documents), dtype='<u8')
+written = np.zeros(len(documents), dtype=bool)
+
 try:
-    with open('files/url_mapper.bin', 'wb') as main_file, open('files/offsets.bin', 'wb') as offset_file:
+    with open('files/url_mapper.bin', 'wb') as main_file:
         rowNo = 1
         current_offset = 0  # Track the current offset in the main file
 
@@ -35,12 +39,16 @@ try:
                 authors = sanitize_value(row[3])  # Assuming the authors are in the 4th column
                 text = sanitize_value(row[1])[:100]
 
-                # Calculate docID
+                # Calculate docID and look up its ordinal, skipping duplicates and unindexed rows
                 docID = sha_256(url)
+                ordinal = documents.get_ordinal(docID)
+                if ordinal is None or written[ordinal]:
+                    rowNo += 1
+                    continue
 
-                # Track the starting offset of this docID
-                offset_file.write(docID.to_bytes(8, byteorder='big'))  # Write docID (8 bytes)
-                offset_file.write(current_offset.to_bytes(8, byteorder='big'))  # Write offset (8 bytes)
+                # Track the starting offset of this document
+                offsets[ordinal] = current_offset
+                written[ordinal] = True
 
                 # Encode and write URL
                 url_encoded = url.encode('utf-8')
@@ -98,6 +106,9 @@ try:
                     print(f"Processed {rowNo} rows")
                 rowNo += 1
 
+    # Write offsets as a flat array indexed by document ordinal (8 bytes each)
+    offsets.tofile('files/offsets.bin')
+
 except Exception as e:
     print(f"Error: {e}")
     print(f"Failed at row: {rowNo}")